@@ -1,2 +1,3 @@
 from .prompt import PromptCLI
 from .controller import Controller
+from .sharded import ShardedController
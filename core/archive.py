@@ -0,0 +1,173 @@
+import mmap
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from uuid import UUID
+
+from .bitboard import to_pos, to_square
+from .board import DRAWS
+
+
+MAGIC = b'CHSA\x01'
+# board id, result, number of moves
+HEADER = struct.Struct('<16sBH')
+MOVE = struct.Struct('<H')
+# The result is the winner color, or DRAWN plus the index of the reason
+DRAWN = 2
+
+
+def encode_move(start, target, flags=0):
+    return start | target << 6 | flags << 12
+
+
+def decode_move(move):
+    return move & 63, move >> 6 & 63, move >> 12
+
+
+def pack_moves(moves):
+    # Square pairs in the archive move format
+    return b''.join(
+        MOVE.pack(encode_move(start, target)) for start, target in moves
+    )
+
+
+def unpack_moves(data):
+    return [decode_move(move)[:2] for (move,) in MOVE.iter_unpack(data)]
+
+
+class GameArchive:
+
+    def __init__(self, path=None, capacity=None, store=None):
+        # Index entries beyond `capacity` age out, oldest first, to `store`
+        self.capacity = capacity
+        self.store = store
+        self.__spilled = 0
+        if path is None:
+            self.__file = tempfile.TemporaryFile()
+        else:
+            mode = 'r+b' if os.path.exists(path) else 'w+b'
+            self.__file = open(path, mode)
+        self.__index = OrderedDict()
+        self.__map = None
+        self.__size = self.__file.seek(0, os.SEEK_END)
+        if self.__size:
+            self.__load_index()
+        else:
+            self.__file.write(MAGIC)
+            self.__file.flush()
+            self.__size = len(MAGIC)
+
+    def __load_index(self):
+        data = self.__mapped()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a game archive')
+        offset = len(MAGIC)
+        while offset + HEADER.size <= self.__size:
+            board_id, _, count = HEADER.unpack_from(data, offset)
+            end = offset + HEADER.size + count * MOVE.size
+            if end > self.__size:
+                break
+            self.__register(UUID(bytes=board_id), offset)
+            offset = end
+        if offset < self.__size:
+            # A torn last record from a crash is cut off, so the next game
+            # is appended right after the last complete one
+            self.__map.close()
+            self.__map = None
+            self.__file.truncate(offset)
+            self.__size = offset
+
+    def __mapped(self):
+        if self.__map is None or len(self.__map) < self.__size:
+            if self.__map is not None:
+                self.__map.close()
+            self.__map = mmap.mmap(
+                self.__file.fileno(), 0, access=mmap.ACCESS_READ,
+            )
+        return self.__map
+
+    def add(self, board_id, winner, moves, draw=None):
+        moves = list(moves)
+        result = int(winner) if draw is None else DRAWN + DRAWS.index(draw)
+        record = HEADER.pack(board_id.bytes, result, len(moves))
+        record += b''.join(MOVE.pack(move) for move in moves)
+        self.__file.seek(self.__size)
+        self.__file.write(record)
+        self.__file.flush()
+        self.__register(board_id, self.__size)
+        self.__size += len(record)
+
+    def __register(self, board_id, offset):
+        index = self.__index
+        index[board_id.int] = offset
+        if self.store is None or self.capacity is None:
+            return
+        if len(index) > self.capacity:
+            spill = []
+            # Half the capacity at once keeps the store writes batched
+            while len(index) > self.capacity // 2:
+                key, offset = index.popitem(last=False)
+                spill.append((UUID(int=key), offset))
+            self.store.put_games(spill)
+            self.__spilled += len(spill)
+
+    def __offset(self, board_id):
+        offset = self.__index.get(board_id.int)
+        if offset is None and self.__spilled:
+            offset = self.store.game_offset(board_id)
+        return offset
+
+    def add_game(self, board):
+        moves = (
+            encode_move(to_square(move.start), to_square(move.target))
+            for move in board.history.moves()
+        )
+        self.add(board.id, board.winner, moves, board.draw)
+
+    def moves(self, board_id):
+        offset = self.__offset(board_id)
+        if offset is None:
+            raise KeyError(board_id)
+        data = self.__mapped()
+        _, _, count = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        for (move,) in MOVE.iter_unpack(
+                data[offset:offset + count * MOVE.size]):
+            yield move
+
+    def get(self, board_id, default=None):
+        if board_id is None:
+            return default
+        offset = self.__offset(board_id)
+        if offset is None:
+            return default
+        _, result, _ = HEADER.unpack_from(self.__mapped(), offset)
+        history = []
+        for move in self.moves(board_id):
+            start, target, _ = decode_move(move)
+            history.append((to_pos(start), to_pos(target)))
+        if result >= DRAWN:
+            winner, draw = None, DRAWS[result - DRAWN]
+        else:
+            winner, draw = bool(result), None
+        return {'winner': winner, 'draw': draw, 'history': history}
+
+    def __contains__(self, board_id):
+        return self.__offset(board_id) is not None
+
+    def __len__(self):
+        return len(self.__index) + self.__spilled
+
+    @property
+    def resident(self):
+        return len(self.__index)
+
+    @property
+    def size(self):
+        return self.__size
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+        self.__file.close()
@@ -0,0 +1,318 @@
+from .tables import (
+    CASTLING_MASK, CASTLING_RIGHTS, CASTLING_ROOKS, CASTLINGS, KING_ATTACKS,
+    KNIGHT_ATTACKS, LIGHT_SQUARES, PAWN_ATTACKS, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT,
+    ZOBRIST_PIECES, ZOBRIST_SIDE, rook_attacks, bishop_attacks,
+)
+from .utils import Colors
+
+
+KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN = range(6)
+
+# Material signature: a 4-bit piece count per color and kind
+MATERIAL = tuple(
+    tuple(1 << 4 * (color * 6 + kind) for kind in range(6))
+    for color in (Colors.WHITE, Colors.BLACK)
+)
+KINGS = MATERIAL[0][KING] + MATERIAL[1][KING]
+# Signatures where neither side can mate, bishops on both sides are
+# checked for their square colors separately
+DEAD_MATERIAL = frozenset(
+    [KINGS] +
+    [KINGS + MATERIAL[color][kind]
+     for color in (Colors.WHITE, Colors.BLACK) for kind in (BISHOP, KNIGHT)]
+)
+BISHOP_EACH = KINGS + MATERIAL[0][BISHOP] + MATERIAL[1][BISHOP]
+
+
+def to_square(pos):
+    row, column = pos
+    return row * 8 + column
+
+
+def to_pos(square):
+    return divmod(square, 8)
+
+
+def en_passant_victim(en_passant, color):
+    # Square of the pawn an en passant capture by `color` removes
+    return en_passant + 8 if color == Colors.WHITE else en_passant - 8
+
+
+def squares_of(bitboard):
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+class Position:
+
+    __slots__ = (
+        'pieces', 'occupied', 'squares', 'kings', 'turn', 'key', 'castling',
+        'en_passant', 'material',
+    )
+
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.squares = [None] * 64
+        self.kings = [None, None]
+        self.turn = Colors.WHITE
+        self.key = 0
+        # Castling rights bitmask and the square a pawn skipped over
+        self.castling = 0
+        self.en_passant = None
+        self.material = 0
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        return cls.from_squares([figure for row in matrix for figure in row])
+
+    @classmethod
+    def from_squares(cls, squares):
+        position = cls()
+        pieces = position.pieces
+        occupied = position.occupied
+        key = 0
+        material = 0
+        for square, figure in enumerate(squares):
+            if figure is None:
+                continue
+            bit = 1 << square
+            color, kind = figure.color, figure.kind
+            pieces[color][kind] |= bit
+            occupied[color] |= bit
+            key ^= ZOBRIST_PIECES[color][kind][square]
+            material += MATERIAL[color][kind]
+            if kind == KING:
+                position.kings[color] = square
+        position.squares = list(squares)
+        position.key = key
+        position.material = material
+        return position
+
+    def to_matrix(self):
+        return [self.squares[i:i + 8] for i in range(0, 64, 8)]
+
+    @property
+    def all(self):
+        return self.occupied[0] | self.occupied[1]
+
+    def compute_key(self):
+        key = ZOBRIST_SIDE if self.turn != Colors.WHITE else 0
+        for square, figure in enumerate(self.squares):
+            if figure is not None:
+                key ^= ZOBRIST_PIECES[figure.color][figure.kind][square]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.en_passant is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant % 8]
+        return key
+
+    def set_turn(self, color):
+        if color != self.turn:
+            self.turn = color
+            self.key ^= ZOBRIST_SIDE
+
+    def set_castling(self, rights):
+        self.key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[rights]
+        self.castling = rights
+
+    def set_en_passant(self, square):
+        # Only kept when a pawn of the side to move can capture there, so
+        # positions differing by an unusable square share a key
+        turn = self.turn
+        if (square is not None and
+                not PAWN_ATTACKS[1 - turn][square] & self.pieces[turn][PAWN]):
+            square = None
+        if self.en_passant is not None:
+            self.key ^= ZOBRIST_EN_PASSANT[self.en_passant % 8]
+        if square is not None:
+            self.key ^= ZOBRIST_EN_PASSANT[square % 8]
+        self.en_passant = square
+
+    def put(self, square, figure):
+        bit = 1 << square
+        self.squares[square] = figure
+        self.pieces[figure.color][figure.kind] |= bit
+        self.occupied[figure.color] |= bit
+        self.key ^= ZOBRIST_PIECES[figure.color][figure.kind][square]
+        self.material += MATERIAL[figure.color][figure.kind]
+        if figure.kind == KING:
+            self.kings[figure.color] = square
+
+    def remove(self, square):
+        figure = self.squares[square]
+        if figure is not None:
+            bit = ~(1 << square)
+            self.squares[square] = None
+            self.pieces[figure.color][figure.kind] &= bit
+            self.occupied[figure.color] &= bit
+            self.key ^= ZOBRIST_PIECES[figure.color][figure.kind][square]
+            self.material -= MATERIAL[figure.color][figure.kind]
+        return figure
+
+    def make_move(self, start, target):
+        squares = self.squares
+        pieces = self.pieces
+        occupied = self.occupied
+        figure = squares[start]
+        color, kind = figure.color, figure.kind
+        captured = squares[target]
+        key = self.key
+        castling = self.castling
+        en_passant = self.en_passant
+        piece_keys = ZOBRIST_PIECES[color][kind]
+        new_key = key ^ piece_keys[start] ^ piece_keys[target] ^ ZOBRIST_SIDE
+        captured_square = target
+        if kind == PAWN and target == en_passant:
+            captured_square = en_passant_victim(target, color)
+            captured = squares[captured_square]
+            squares[captured_square] = None
+        if captured is not None:
+            bit = 1 << captured_square
+            pieces[captured.color][captured.kind] ^= bit
+            occupied[captured.color] ^= bit
+            new_key ^= ZOBRIST_PIECES[captured.color][captured.kind][
+                captured_square]
+            self.material -= MATERIAL[captured.color][captured.kind]
+        mask = 1 << start | 1 << target
+        pieces[color][kind] ^= mask
+        occupied[color] ^= mask
+        squares[target] = figure
+        squares[start] = None
+        if kind == KING:
+            self.kings[color] = target
+            if target - start in (2, -2):
+                rook, rook_target = CASTLING_ROOKS[target]
+                self.__move_rook(color, rook, rook_target)
+                rook_keys = ZOBRIST_PIECES[color][ROOK]
+                new_key ^= rook_keys[rook] ^ rook_keys[rook_target]
+
+        rights = castling & CASTLING_MASK[start] & CASTLING_MASK[target]
+        if rights != castling:
+            new_key ^= ZOBRIST_CASTLING[castling] ^ ZOBRIST_CASTLING[rights]
+            self.castling = rights
+        if en_passant is not None:
+            new_key ^= ZOBRIST_EN_PASSANT[en_passant % 8]
+            self.en_passant = None
+        if kind == PAWN and target - start in (16, -16):
+            skipped = (start + target) // 2
+            if PAWN_ATTACKS[color][skipped] & pieces[1 - color][PAWN]:
+                new_key ^= ZOBRIST_EN_PASSANT[skipped % 8]
+                self.en_passant = skipped
+        self.key = new_key
+        self.turn = 1 - self.turn
+        return start, target, figure, captured, key, castling, en_passant
+
+    def unmake_move(self, undo):
+        start, target, figure, captured, key, castling, en_passant = undo
+        self.key = key
+        self.turn = 1 - self.turn
+        self.castling = castling
+        self.en_passant = en_passant
+        squares = self.squares
+        color, kind = figure.color, figure.kind
+        mask = 1 << start | 1 << target
+        self.pieces[color][kind] ^= mask
+        self.occupied[color] ^= mask
+        squares[start] = figure
+        squares[target] = None
+        if kind == KING:
+            self.kings[color] = start
+            if target - start in (2, -2):
+                rook, rook_target = CASTLING_ROOKS[target]
+                self.__move_rook(color, rook_target, rook)
+        if captured is not None:
+            captured_square = target
+            if kind == PAWN and target == en_passant:
+                captured_square = en_passant_victim(target, color)
+            bit = 1 << captured_square
+            squares[captured_square] = captured
+            self.pieces[captured.color][captured.kind] ^= bit
+            self.occupied[captured.color] ^= bit
+            self.material += MATERIAL[captured.color][captured.kind]
+
+    def __move_rook(self, color, start, target):
+        squares = self.squares
+        mask = 1 << start | 1 << target
+        self.pieces[color][ROOK] ^= mask
+        self.occupied[color] ^= mask
+        squares[target] = squares[start]
+        squares[start] = None
+
+    def is_safe_move(self, start, target):
+        color = self.squares[start].color
+        undo = self.make_move(start, target)
+        safe = not self.in_check(color)
+        self.unmake_move(undo)
+        return safe
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.pieces = [self.pieces[0].copy(), self.pieces[1].copy()]
+        position.occupied = self.occupied.copy()
+        position.squares = self.squares.copy()
+        position.kings = self.kings.copy()
+        position.turn = self.turn
+        position.key = self.key
+        position.castling = self.castling
+        position.en_passant = self.en_passant
+        position.material = self.material
+        return position
+
+    def castling_targets(self, color, danger=None):
+        # King targets of the castlings `color` can make right now.
+        # `danger` is a precomputed attack map of the other side.
+        rights = self.castling & CASTLING_RIGHTS[color]
+        if not rights:
+            return 0
+        occupied = self.all
+        result = 0
+        for right, _, target, _, _, empty, path in CASTLINGS[color]:
+            if not rights & right or occupied & empty:
+                continue
+            if danger is None:
+                if any(self.is_attacked(square, 1 - color)
+                       for square in squares_of(path)):
+                    continue
+            elif path & danger:
+                continue
+            result |= 1 << target
+        return result
+
+    def insufficient_material(self):
+        material = self.material
+        if material in DEAD_MATERIAL:
+            return True
+        if material == BISHOP_EACH:
+            # Bishops on squares of one color can never mate
+            bishops = self.pieces[0][BISHOP] | self.pieces[1][BISHOP]
+            return not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES
+        return False
+
+    def king_square(self, color):
+        return self.kings[color]
+
+    def figures(self, color):
+        squares = self.squares
+        for square in squares_of(self.occupied[color]):
+            yield square, squares[square]
+
+    def attackers(self, square, color):
+        pieces = self.pieces[color]
+        occupied = self.all
+        straight = pieces[ROOK] | pieces[QUEEN]
+        diagonal = pieces[BISHOP] | pieces[QUEEN]
+        return (
+            KNIGHT_ATTACKS[square] & pieces[KNIGHT] |
+            KING_ATTACKS[square] & pieces[KING] |
+            PAWN_ATTACKS[1 - color][square] & pieces[PAWN] |
+            rook_attacks(square, occupied) & straight |
+            bishop_attacks(square, occupied) & diagonal
+        )
+
+    def is_attacked(self, square, color):
+        return self.attackers(square, color) != 0
+
+    def in_check(self, color):
+        return self.is_attacked(self.king_square(color), 1 - color)
@@ -1,116 +1,474 @@
 from dataclasses import dataclass
+from time import perf_counter
 
-from utils import Colors
-from figure import ORDER, PAWNS, Figure
+from .utils import Colors
+from .figure import ORDER, PAWNS, STALEMATE, Figure
+from .bitboard import KING, PAWN, Position, to_square, to_pos
+from .fen import parse_fen, to_fen
+from .movegen import legal_moves
+from .tables import ALL_CASTLING, CASTLING_ROOKS
 
 
-@dataclass
+@dataclass(slots=True)
 class Move:
 
-    prev = None
     figure: Figure
     start: tuple
     target: tuple
-    state: list
-    next = None
+    # Position undo record and the halfmove clock before the move
+    undo: tuple = None
+    halfmove: int = 0
 
 
 class History:
 
+    __slots__ = ('__moves', '__by_piece', '__origins', '__changes', '__undone')
+
     def __init__(self):
-        self.__first_move = None
-        self.__last_move = None
-        self.__by_figure = {}
+        self.__moves = []
+        # Plies of every piece's moves, in order. Figures are shared by
+        # all pieces of a kind, so a piece is known by its starting square.
+        self.__by_piece = {}
+        # Starting square of the pieces away from it, by their current square
+        self.__origins = {}
+        # Two bytes per ply: the origin of the moved piece and the previous
+        # entry of its target square plus one, 0 for none
+        self.__changes = bytearray()
+        # Taken back moves, the last one is redone first
+        self.__undone = []
 
     def register(self, move):
-        figure = move.figure
-        figure_moves = self.__by_figure.get(figure, [])
-        figure_moves.append(move)
-        self.__by_figure[figure] = figure_moves
+        self.__undone.clear()
+        self.__append(move)
+
+    def __append(self, move):
+        origins = self.__origins
+        start, target = to_square(move.start), to_square(move.target)
+        origin = origins.pop(start, start)
+        previous = origins.pop(target, -1)
+        if origin != target:
+            origins[target] = origin
+        ply = len(self.__moves)
+        if move.figure.kind == KING and target - start in (2, -2):
+            # Castling is a move of the rook as well
+            rook, rook_target = CASTLING_ROOKS[target]
+            rook_origin = origins.pop(rook, rook)
+            origins[rook_target] = rook_origin
+            self.__by_piece.setdefault(rook_origin, []).append(ply)
+        self.__changes += bytes((origin, previous + 1))
+        self.__by_piece.setdefault(origin, []).append(ply)
+        self.__moves.append(move)
+
+    def undo(self):
+        if not self.__moves:
+            return None
+        move = self.__moves.pop()
+        origins = self.__origins
+        start, target = to_square(move.start), to_square(move.target)
+        previous = self.__changes.pop()
+        origin = self.__changes.pop()
+        if move.figure.kind == KING and target - start in (2, -2):
+            rook, rook_target = CASTLING_ROOKS[target]
+            rook_origin = origins.pop(rook_target)
+            if rook_origin != rook:
+                origins[rook] = rook_origin
+            self.__unindex(rook_origin)
+        origins.pop(target, None)
+        if previous:
+            origins[target] = previous - 1
+        if origin != start:
+            origins[start] = origin
+        self.__unindex(origin)
+        self.__undone.append(move)
+        return move
+
+    def __unindex(self, origin):
+        plies = self.__by_piece[origin]
+        plies.pop()
+        if not plies:
+            del self.__by_piece[origin]
 
-        move.prev = self.__last_move
-        self.__last_move.next = move
-        self.__last_move = move
+    def redo(self):
+        if not self.__undone:
+            return None
+        move = self.__undone.pop()
+        self.__append(move)
+        return move
+
+    def __len__(self):
+        return len(self.__moves)
+
+    def __getitem__(self, ply):
+        return self.__moves[ply]
 
     @property
     def last_move(self):
-        return self.__last_move
+        return self.__moves[-1] if self.__moves else None
 
     @property
     def first_move(self):
-        return self.__first_move
-    
-    def get_figure_moves(self, figure):
-        return self.__by_figure.get(figure, [])
-    
+        return self.__moves[0] if self.__moves else None
+
+    @property
+    def can_redo(self):
+        return bool(self.__undone)
+
+    def origin_of(self, pos):
+        # Starting square of the piece now on `pos`
+        square = to_square(pos)
+        return to_pos(self.__origins.get(square, square))
+
+    def get_figure_plies(self, origin):
+        return tuple(self.__by_piece.get(to_square(origin), ()))
+
+    def get_figure_moves(self, origin):
+        moves = self.__moves
+        plies = self.__by_piece.get(to_square(origin), ())
+        return [moves[ply] for ply in plies]
+
     def moves(self, reverse=False):
-        curr = self.first_move
-        attr = 'next'
         if reverse:
-            curr = self.last_move
-            attr = 'prev'
-        while curr:
-            yield curr
-            curr = getattr(curr, attr)
+            return reversed(self.__moves)
+        return iter(self.__moves)
+
+
+# Cached status of a position whose side not to move is in check
+ILLEGAL = -1
+MISSING = object()
+
+STALEMATE_DRAW = 'stalemate'
+REPETITION = 'threefold repetition'
+FIFTY_MOVES = 'fifty-move rule'
+DEAD_POSITION = 'insufficient material'
+DRAWS = (STALEMATE_DRAW, REPETITION, FIFTY_MOVES, DEAD_POSITION)
 
 
 class Board:
 
-    def __init__(self, id):
+    __slots__ = (
+        '__id', '__cache', '__history', '__plies', '__start_ply',
+        '__halfmove', '__pending', '__position', '__loser', '__draw',
+        '__repetitions', '__telemetry', '__clock',
+    )
+
+    def __init__(self, id, cache=None, squares=None, telemetry=None):
         self.__id = id
-        self.__matrix = [[None] * 8 for i in range(8)]
-        self._turn = 0
+        self.__cache = cache
+        self.__telemetry = telemetry
+        self.__clock = None
         self.__history = History()
+        self.__plies = 0
+        # Plies played before the board was created, from a FEN
+        self.__start_ply = 0
+        self.__halfmove = 0
+        # Moves restored without History entries, see `restore`
+        self.__pending = None
 
-        self.set_up()
+        if squares is None:
+            self.set_up()
+        else:
+            self.__position = Position.from_squares(squares)
         self.__loser = None
+        # Reason of a drawn game, one of DRAWS
+        self.__draw = None
+        # How many times each position key occurred in the game
+        self.__repetitions = {self.__position.key: 1}
+
+    @classmethod
+    def restore(cls, id, moves, cache=None, telemetry=None):
+        # Trusted moves are played without legality checks or History
+        # entries, those are built on first use
+        board = cls(id, cache, telemetry=telemetry)
+        position = board.__position
+        repetitions = board.__repetitions
+        moves = list(moves)
+        halfmove = 0
+        for start, target in moves:
+            _, _, figure, captured, *_ = position.make_move(start, target)
+            if captured is not None or figure.kind == PAWN:
+                halfmove = 0
+            else:
+                halfmove += 1
+            repetitions[position.key] = repetitions.get(position.key, 0) + 1
+        board.__plies = len(moves)
+        board.__halfmove = halfmove
+        board.__pending = moves
+        return board
+
+    def move_list(self):
+        if self.__pending is not None:
+            return list(self.__pending)
+        return [
+            (to_square(move.start), to_square(move.target))
+            for move in self.__history.moves()
+        ]
+
+    def __materialize(self):
+        # Replays on a scratch position holding the same figures, so the
+        # undo records match the live position
+        moves = self.__pending
+        self.__pending = None
+        position = self.initial_position()
+        halfmove = 0
+        for start, target in moves:
+            figure = position.squares[start]
+            move = Move(
+                figure, to_pos(start), to_pos(target), halfmove=halfmove,
+            )
+            move.undo = position.make_move(start, target)
+            halfmove = self.__next_halfmove(move)
+            self.__history.register(move)
+
+    @classmethod
+    def from_fen(cls, id, fen, cache=None, telemetry=None):
+        data = parse_fen(fen)
+        board = cls(id, cache, data['squares'], telemetry)
+        position = board.__position
+        position.set_turn(data['turn'])
+        position.set_castling(data['castling'])
+        position.set_en_passant(data['en_passant'])
+        board.__start_ply = (data['fullmove'] - 1) * 2 + data['turn']
+        board.__halfmove = data['halfmove']
+        board.__repetitions = {position.key: 1}
+        return board
+
+    @classmethod
+    def from_squares(cls, id, squares, turn, cache=None, telemetry=None):
+        board = cls(id, cache, squares, telemetry)
+        position = board.__position
+        position.set_turn(turn)
+        board.__start_ply = turn
+        board.__repetitions = {position.key: 1}
+        return board
+
+    def fen(self):
+        position = self.__position
+        fullmove = (self.__start_ply + self.__plies) // 2 + 1
+        return to_fen(
+            position.squares, position.turn, position.castling,
+            position.en_passant, halfmove=self.__halfmove, fullmove=fullmove,
+        )
+
+    @staticmethod
+    def initial_squares():
+        return (
+            [cls(Colors.BLACK) for cls in ORDER] +
+            [cls(Colors.BLACK) for cls in PAWNS] +
+            [None] * 32 +
+            [cls(Colors.WHITE) for cls in PAWNS] +
+            [cls(Colors.WHITE) for cls in ORDER]
+        )
+
+    @classmethod
+    def initial_position(cls):
+        position = Position.from_squares(cls.initial_squares())
+        position.set_castling(ALL_CASTLING)
+        return position
 
     def set_up(self):
-        self.__matrix[0] = [cls(Colors.BLACK) for cls in ORDER]
-        self.__matrix[1] = [cls(Colors.BLACK) for cls in PAWNS]
-        self.__matrix[6] = [cls(Colors.WHITE) for cls in PAWNS]
-        self.__matrix[7] = [cls(Colors.WHITE) for cls in ORDER]
+        self.__position = self.initial_position()
 
     def make_move(self, start_pos, target_pos):
-        start_row, start_column = start_pos 
-        target_row, target_column = target_pos
+        start = to_square(start_pos)
+        target = to_square(target_pos)
+        position = self.__position
 
-        figure = self.__matrix[start_row][start_column]
+        figure = position.squares[start]
         if figure is None:
             return {'msg': 'You have entered an empty cell'}
-        if self._turn != figure.color:
+        if position.turn != figure.color:
             return {'msg': 'Not your turn!'}
-        target_cell = self.__matrix[target_row][target_column]
+        target_cell = position.squares[target]
         if target_cell and target_cell.color == figure.color:
             return {'msg': "Can't move to busy cell"}
 
-        move = Move(figure, start_pos, target_pos, self.state)
+        telemetry = self.__telemetry
+        if telemetry is not None:
+            started = perf_counter()
+        reachable = figure.targets(start, position) >> target & 1
+        if telemetry is not None:
+            checked = perf_counter()
+            telemetry.observe('move.targets', checked - started)
+        if not reachable:
+            return {'msg': 'The move is impossible'}
+        undo = position.make_move(start, target)
+        status = self.__position_status()
+        position.unmake_move(undo)
+        if telemetry is not None:
+            telemetry.observe('move.status', perf_counter() - checked)
+        if status == ILLEGAL:
+            return {'msg': 'The move is impossible'}
 
-        if figure.can_move(start_pos, target_pos, self.state):
-            self.__matrix[target_row][target_column] = figure
-            self.__matrix[start_row][start_column] = None
-            self._turn = not self._turn
-            self.__history.register(move)
-            self.__loser = figure.check_for_mate(self._turn, self.state)
-            return {'msg': 'Move done!'}
-        return {'msg': 'The move is impossible'}
+        move = Move(figure, start_pos, target_pos)
+        self.history.register(move)
+        self.__push(move)
+        self.__set_result(status)
+        return {'msg': 'Move done!'}
+
+    def __push(self, move):
+        move.halfmove = self.__halfmove
+        position = self.__position
+        move.undo = position.make_move(
+            to_square(move.start), to_square(move.target),
+        )
+        self.__halfmove = self.__next_halfmove(move)
+        self.__plies += 1
+        repetitions = self.__repetitions
+        repetitions[position.key] = repetitions.get(position.key, 0) + 1
+
+    def __set_result(self, status):
+        # Every draw rule reads state kept up to date by the moves
+        self.__loser = None
+        self.__draw = None
+        if status == STALEMATE:
+            self.__draw = STALEMATE_DRAW
+        elif status is not None:
+            self.__loser = status
+        elif self.__repetitions[self.__position.key] >= 3:
+            self.__draw = REPETITION
+        elif self.__halfmove >= 100:
+            self.__draw = FIFTY_MOVES
+        elif self.__position.insufficient_material():
+            self.__draw = DEAD_POSITION
+
+    @staticmethod
+    def __next_halfmove(move):
+        _, _, figure, captured, *_ = move.undo
+        if captured is not None or figure.kind == PAWN:
+            return 0
+        return move.halfmove + 1
+
+    def undo_move(self):
+        move = self.history.undo()
+        if move is None:
+            return {'msg': 'There are no moves to take back'}
+        position = self.__position
+        repetitions = self.__repetitions
+        if repetitions[position.key] == 1:
+            del repetitions[position.key]
+        else:
+            repetitions[position.key] -= 1
+        position.unmake_move(move.undo)
+        self.__halfmove = move.halfmove
+        self.__plies -= 1
+        self.__loser = None
+        self.__draw = None
+        return {'msg': 'Move taken back!'}
+
+    def redo_move(self):
+        move = self.history.redo()
+        if move is None:
+            return {'msg': 'There are no moves to redo'}
+        self.__push(move)
+        self.__set_result(self.__position_status())
+        return {'msg': 'Move done!'}
+
+    def __position_status(self):
+        position = self.__position
+        cache = self.__cache
+        if cache is not None:
+            status = cache.get(position.key, MISSING)
+            if status is not MISSING:
+                return status
+        if not Figure.is_not_check(1 - position.turn, position):
+            status = ILLEGAL
+        else:
+            status = Figure.game_status(position.turn, position)
+        if cache is not None:
+            cache.put(position.key, status)
+        return status
+
+    def __getstate__(self):
+        names = [f'_Board{slot}' for slot in Board.__slots__]
+        state = {
+            name: getattr(self, name) for name in names if hasattr(self, name)
+        }
+        state['_Board__cache'] = None
+        state['_Board__telemetry'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
 
     @property
     def id(self):
         return self.__id
 
+    @property
+    def position(self):
+        return self.__position
+
+    @property
+    def turn(self):
+        return self.__position.turn
+
+    @property
+    def key(self):
+        return self.__position.key
+
+    def legal_moves(self):
+        position = self.__position
+        for start, target in legal_moves(position, position.turn):
+            yield to_pos(start), to_pos(target)
+
+    def king_pos(self, color):
+        return to_pos(self.__position.king_square(color))
+
+    def figures(self, color):
+        for square, figure in self.__position.figures(color):
+            yield to_pos(square), figure
+
     @property
     def state(self):
-        return [row.copy() for row in self.__matrix]
+        return self.__position.to_matrix()
 
     @property
     def history(self):
+        if self.__pending is not None:
+            self.__materialize()
         return self.__history
 
+    @property
+    def plies(self):
+        return self.__plies
+
+    @property
+    def castling(self):
+        return self.__position.castling
+
+    @property
+    def en_passant(self):
+        square = self.__position.en_passant
+        return None if square is None else to_pos(square)
+
+    @property
+    def halfmove_clock(self):
+        return self.__halfmove
+
     @property
     def winner(self):
+        if self.__draw is not None:
+            return None
         return not self.__loser
 
+    @property
+    def draw(self):
+        return self.__draw
+
+    @property
+    def clock(self):
+        return self.__clock
+
+    @clock.setter
+    def clock(self, clock):
+        self.__clock = clock
+
+    def flag(self, color):
+        # The side whose time ran out loses
+        if not self.is_over:
+            self.__loser = color
+
     @property
     def is_over(self):
-        return self.__loser is not None
+        return self.__loser is not None or self.__draw is not None
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+
+class ResultCache:
+
+    # Measured cost of one OrderedDict entry with a 64-bit int key
+    ENTRY_BYTES = 144
+    DEFAULT_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, max_bytes=DEFAULT_BYTES):
+        self.capacity = max(max_bytes, 0) // self.ENTRY_BYTES
+        self.__entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entries = self.__entries
+        if key not in entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        entries.move_to_end(key)
+        return entries[key]
+
+    def put(self, key, value):
+        if not self.capacity:
+            return
+        entries = self.__entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.__entries),
+            'capacity': self.capacity,
+            'max_bytes': self.capacity * self.ENTRY_BYTES,
+        }
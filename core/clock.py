@@ -0,0 +1,108 @@
+import heapq
+import math
+import struct
+from itertools import count
+
+from .utils import Colors
+
+
+# remaining white, remaining black, increment, started, side to move
+PACKED_CLOCK = struct.Struct('<ddddB')
+
+
+class GameClock:
+
+    __slots__ = ('remaining', 'increment', 'turn', 'started')
+
+    def __init__(self, seconds, increment=0.0, turn=Colors.WHITE,
+                 started=None):
+        self.remaining = [float(seconds), float(seconds)]
+        self.increment = float(increment)
+        self.turn = turn
+        # When the side to move started thinking, None while stopped
+        self.started = started
+
+    def start(self, now):
+        self.started = now
+
+    def left(self, color, now):
+        remaining = self.remaining[color]
+        if color == self.turn and self.started is not None:
+            remaining -= now - self.started
+        return remaining
+
+    def flagged(self, now):
+        return self.left(self.turn, now) <= 0
+
+    @property
+    def deadline(self):
+        return self.started + self.remaining[self.turn]
+
+    def press(self, now):
+        # Ends the turn of the side to move, which gets its increment
+        self.switch(now)
+        self.remaining[1 - self.turn] += self.increment
+
+    def switch(self, now):
+        color = self.turn
+        self.remaining[color] = self.left(color, now)
+        self.turn = 1 - color
+        self.started = now
+
+    def pack(self):
+        started = math.nan if self.started is None else self.started
+        return PACKED_CLOCK.pack(*self.remaining, self.increment, started,
+                                 self.turn)
+
+    @classmethod
+    def unpack(cls, data):
+        white, black, increment, started, turn = PACKED_CLOCK.unpack(data)
+        if math.isnan(started):
+            started = None
+        clock = cls(0, increment, turn, started)
+        clock.remaining = [white, black]
+        return clock
+
+
+class TimerHeap:
+
+    # One deadline per key. Rescheduling leaves the old entry in the heap,
+    # where it is skipped once it comes up.
+    def __init__(self):
+        self.__heap = []
+        self.__deadlines = {}
+        self.__order = count()
+
+    def schedule(self, key, deadline):
+        self.__deadlines[key] = deadline
+        heapq.heappush(self.__heap, (deadline, next(self.__order), key))
+        if len(self.__heap) > 2 * len(self.__deadlines) + 64:
+            self.__compact()
+
+    def cancel(self, key):
+        self.__deadlines.pop(key, None)
+
+    def __compact(self):
+        self.__heap = [
+            (deadline, next(self.__order), key)
+            for key, deadline in self.__deadlines.items()
+        ]
+        heapq.heapify(self.__heap)
+
+    @property
+    def next_deadline(self):
+        return self.__heap[0][0] if self.__heap else None
+
+    def expired(self, now):
+        heap = self.__heap
+        deadlines = self.__deadlines
+        result = []
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            if deadlines.get(key) == deadline:
+                del deadlines[key]
+                result.append(key)
+        return result
+
+    def __len__(self):
+        return len(self.__deadlines)
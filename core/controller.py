@@ -1,14 +1,84 @@
+import time
+from functools import partial
+from time import perf_counter
 from uuid import uuid4, UUID
 
+from .archive import GameArchive
 from .board import Board
-from .utils import Validator
+from .bitboard import to_pos, to_square
+from .cache import ResultCache
+from .clock import GameClock, TimerHeap
+from .journal import Journal
+from .registry import BoardRegistry, DiskStore
+from .metrics import Metrics, timed, to_prometheus
+from .search import MAX_SECONDS, Searcher
+from .utils import COLOR_NAMES, Colors, Validator
+
+
+def search_hint(searcher, position, budget, nodes):
+    result = searcher.search(position, budget, nodes)
+    if result['move'] is None:
+        return {'msg': 'There are no moves'}
+    start, target = result['move']
+    from_cell = Validator.pos_to_cellname(to_pos(start))
+    target_cell = Validator.pos_to_cellname(to_pos(target))
+    return {'msg': f'{from_cell} {target_cell}'}
+
 
 class Controller:
 
-    def __init__(self):
-        self.boards = {}
-        self.archived = {}
+    def __init__(self, cache_bytes=ResultCache.DEFAULT_BYTES,
+                 archive_path=None, journal_dir=None, metrics=True,
+                 profiler=None, capacity=None, idle_seconds=None,
+                 archive_capacity=None, store_path=None,
+                 clock=time.monotonic):
+        # Boards over `capacity` or idle for `idle_seconds`, and archive
+        # index entries over `archive_capacity`, spill to one disk store
+        self.store = None
+        limits = (capacity, idle_seconds, archive_capacity, store_path)
+        if any(limit is not None for limit in limits):
+            self.store = DiskStore(store_path)
+            if journal_dir is not None:
+                # The journal restores every board on its own
+                self.store.clear_boards()
+        self.clock = clock
+        # Flag-fall deadlines of every timed board
+        self.timers = TimerHeap()
+        self.boards = BoardRegistry(
+            self._load_board, self.store, capacity, idle_seconds, clock,
+        )
+        self.archived = GameArchive(archive_path, archive_capacity, self.store)
+        self.cache = ResultCache(cache_bytes)
+        self.searcher = Searcher()
+        self.telemetry = Metrics() if metrics else None
+        # Optional MoveProfiler that samples calls to make_move(s)
+        self.profiler = profiler
+        self.journal = None
+        if journal_dir is not None:
+            self.journal = Journal(journal_dir)
+            self.boards.update(
+                self.journal.restore(self.cache, self.telemetry)
+            )
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+        self.archived.close()
+        if self.store is not None:
+            self.store.close()
+
+    def _load_board(self, board_id, moves):
+        return Board.restore(board_id, moves, self.cache, self.telemetry)
+
+    def evict_idle(self):
+        self.boards.evict_idle()
+
+    def _journal(self, method, *args):
+        if self.journal is None:
+            return
+        getattr(self.journal, method)(*args)
 
+    @timed('make_move')
     def make_move(self, board_id, from_cell, target_cell):
         board_id = self.convert_id(board_id)
         if not board_id:
@@ -16,47 +86,242 @@ class Controller:
         
         if not (board := self.boards.get(board_id)):
             return {'msg': self.game_stat(board_id)}
-        
-        if (not Validator.is_valid_cellname(from_cell.upper()) or
-            not Validator.is_valid_cellname(target_cell.upper())):
-            return {'msg': 'The square notation is invalid'}
-        
-        from_pos = Validator.cellname_to_pos(from_cell.upper())
-        target_pos = Validator.cellname_to_pos(target_cell.upper())
+        return {'msg': self._apply_move(board, from_cell, target_cell)}
+
+    @timed('make_moves')
+    def make_moves(self, batch):
+        results = [None] * len(batch)
+        ids = {}
+        by_board = {}
+        for i, (board_id, from_cell, target_cell) in enumerate(batch):
+            if (converted := ids.get(board_id)) is None:
+                converted = ids[board_id] = self.convert_id(board_id) or False
+            if not converted:
+                results[i] = 'Invalid board id'
+                continue
+            by_board.setdefault(converted, []).append(
+                (i, from_cell, target_cell)
+            )
+
+        for board_id, moves in by_board.items():
+            board = self.boards.get(board_id)
+            for i, from_cell, target_cell in moves:
+                if board is None:
+                    results[i] = self.game_stat(board_id)
+                    continue
+                results[i] = self._apply_move(board, from_cell, target_cell)
+                if board_id not in self.boards:
+                    board = None
+        return results
+
+    def _apply_move(self, board, from_cell, target_cell):
+        profiler = self.profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                board.fen(), (from_cell, target_cell),
+                self._play_move, board, from_cell, target_cell,
+            )
+        return self._play_move(board, from_cell, target_cell)
+
+    def _play_move(self, board, from_cell, target_cell):
+        telemetry = self.telemetry
+        if telemetry is not None:
+            started = perf_counter()
+        from_pos = Validator.lookup_cellname(from_cell)
+        target_pos = Validator.lookup_cellname(target_cell)
+        if telemetry is not None:
+            telemetry.observe('move.parse', perf_counter() - started)
+        if from_pos is None or target_pos is None:
+            return 'The square notation is invalid'
         if from_pos == target_pos:
-            return {'msg': "Can't make move to the same square"}
-        msg = board.make_move(from_pos, target_pos)
+            return "Can't make move to the same square"
+        clock = board.clock
+        if clock is not None and clock.flagged(self.clock()):
+            return self._flag(board)
+        plies = board.plies
+        msg = board.make_move(from_pos, target_pos)['msg']
+        if board.plies != plies:
+            self._journal(
+                'move', board.id, to_square(from_pos), to_square(target_pos),
+            )
+            if clock is not None:
+                clock.press(self.clock())
+                self.timers.schedule(board.id, clock.deadline)
+        if telemetry is not None:
+            accepted = board.plies != plies
+            telemetry.incr('moves.accepted' if accepted else 'moves.rejected')
         if board.is_over:
             self.game_over(board)
-            return {'msg': self.game_stat(board_id)}
+            return self.game_stat(board.id)
         return msg
 
+    @timed('undo_move')
+    def undo_move(self, board_id):
+        board_id = self.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        if not (board := self.boards.get(board_id)):
+            return {'msg': 'Incorrect board id'}
+        plies = board.plies
+        result = board.undo_move()
+        if board.plies != plies:
+            self._journal('undo', board_id)
+            self._switch_clock(board)
+        return result
+
+    @timed('redo_move')
+    def redo_move(self, board_id):
+        board_id = self.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        if not (board := self.boards.get(board_id)):
+            return {'msg': 'Incorrect board id'}
+        plies = board.plies
+        result = board.redo_move()
+        if board.plies != plies:
+            move = board.history.last_move
+            self._journal(
+                'move', board_id,
+                to_square(move.start), to_square(move.target),
+            )
+            self._switch_clock(board)
+        if board.is_over:
+            self.game_over(board)
+            return {'msg': self.game_stat(board_id)}
+        return result
+
+    def _switch_clock(self, board):
+        # Takebacks hand the clock over without an increment
+        if board.clock is not None:
+            board.clock.switch(self.clock())
+            self.timers.schedule(board.id, board.clock.deadline)
+
+    def _flag(self, board):
+        board.flag(board.clock.turn)
+        self.game_over(board)
+        return self.game_stat(board.id)
+
+    @timed('tick')
+    def tick(self):
+        # Ends every game whose side to move ran out of time
+        now = self.clock()
+        ended = []
+        for board_id in self.timers.expired(now):
+            board = self.boards.get(board_id)
+            if board is None or board.clock is None:
+                continue
+            if not board.clock.flagged(now):
+                self.timers.schedule(board_id, board.clock.deadline)
+                continue
+            self._flag(board)
+            ended.append(board_id)
+        if self.journal is not None:
+            self._maintain_journal()
+        return ended
+
+    def _maintain_journal(self):
+        # Done on the tick, so no move call waits for the fsync of a quiet
+        # journal or for a snapshot of every board
+        self.journal.sync_due()
+        if self.journal.needs_snapshot:
+            self.journal.snapshot(self.boards.move_lists(), background=True)
+
+    @timed('clock_state')
+    def clock_state(self, board_id):
+        board_id = self.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        if not (board := self.boards.get(board_id)):
+            return {'msg': 'Incorrect board id'}
+        if board.clock is None:
+            return {'msg': 'The board has no clock'}
+        now = self.clock()
+        return {'msg': {
+            COLOR_NAMES[color]: max(board.clock.left(color, now), 0.0)
+            for color in (Colors.WHITE, Colors.BLACK)
+        }}
+
+    def best_move(self, board_id, budget=1.0, nodes=None):
+        job = self.search_job(board_id, budget, nodes)
+        if isinstance(job, dict):
+            return job
+        started = perf_counter()
+        result = job()
+        self.observe('best_move', perf_counter() - started)
+        return result
+
+    def search_job(self, board_id, budget=1.0, nodes=None):
+        request = self.search_request(board_id, budget, nodes)
+        if isinstance(request, dict):
+            return request
+        return partial(search_hint, self.searcher, *request)
+
+    def search_request(self, board_id, budget=1.0, nodes=None):
+        # Checks the request and copies the position, so the search itself
+        # can run on another thread or process than the one serving boards
+        board_id = self.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        if not (board := self.boards.get(board_id)):
+            return {'msg': 'Incorrect board id'}
+        if (isinstance(budget, bool) or
+                not isinstance(budget, (int, float)) or not budget > 0):
+            return {'msg': 'The search budget must be a positive number'}
+        if nodes is not None and (
+                isinstance(nodes, bool) or not isinstance(nodes, int) or
+                nodes <= 0):
+            return {'msg': 'The node limit must be a positive integer'}
+        return board.position.copy(), min(budget, MAX_SECONDS), nodes
+
+    def observe(self, name, seconds):
+        # Latencies timed by the caller, like searches the server runs on
+        # its own thread: only the board thread writes to the telemetry
+        if self.telemetry is not None:
+            self.telemetry.observe(name, seconds)
+
+    @timed('game_stat')
     def game_stat(self, board_id):
+        board_id = self.convert_id(board_id)
         return self.archived.get(board_id, 'Incorrect board id')
 
     def game_over(self, board):
-        self.archived[board.id] = {
-            'winner': board.winner,
-            'history': board.history,
-        }
+        if self.telemetry is not None:
+            self.telemetry.incr('games.finished')
+        self.archived.add_game(board)
         return self.end_board(board.id)
 
-    def start_new_board(self):
-        new_id = uuid4()
-        self.boards[new_id] = Board(new_id)
+    def start_new_board(self, seconds=None, increment=0):
+        return self._start_board(uuid4(), seconds, increment)
+
+    @timed('start_new_board')
+    def _start_board(self, new_id, seconds=None, increment=0):
+        # ShardedController picks the id, so it knows the shard of the board
+        if new_id in self.boards or new_id in self.archived:
+            raise ValueError(f'Board {new_id} already exists')
+        board = Board(new_id, cache=self.cache, telemetry=self.telemetry)
+        if seconds is not None:
+            board.clock = GameClock(seconds, increment, started=self.clock())
+            self.timers.schedule(new_id, board.clock.deadline)
+        self.boards[new_id] = board
+        self._journal('new_board', new_id)
         return new_id
 
+    @timed('end_board')
     def end_board(self, board_id):
         board_id = self.convert_id(board_id)
         if not board_id:
             return {'msg': 'Invalid board id'}
         if not self.boards.get(board_id):
             return {'msg': 'Incorrect board id'}
-        return {'msg': self.boards.pop(board_id)}
+        board = self.boards.pop(board_id)
+        self.timers.cancel(board_id)
+        self._journal('end_board', board_id)
+        return {'msg': board}
 
     def all_boards(self):
         return list(self.boards.keys())
 
+    @timed('show_board')
     def show_board(self, board_id):
         board_id = self.convert_id(board_id)
         if not board_id:
@@ -65,6 +330,52 @@ class Controller:
             return {'msg': 'Incorrect board id'}
         return {'msg': self.boards[board_id].state}
 
+    @timed('show_moves')
+    def show_moves(self, board_id, first=0, last=None):
+        board_id = self.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        if not (board := self.boards.get(board_id)):
+            return {'msg': 'Incorrect board id'}
+        return {'msg': [
+            (move.start, move.target)
+            for move in board.history[first:last]
+        ]}
+
+    def gauges(self):
+        registry = self.boards.stats()
+        cache = self.cache.stats()
+        return {
+            'boards': len(self.boards),
+            'boards_resident': registry['resident'],
+            'board_evictions': registry['evictions'],
+            'board_reloads': registry['reloads'],
+            'archived_games': len(self.archived),
+            'archived_resident': self.archived.resident,
+            'archive_bytes': self.archived.size,
+            'cache_entries': cache['size'],
+            'cache_hits': cache['hits'],
+            'cache_misses': cache['misses'],
+            'cache_evictions': cache['evictions'],
+            'timers': len(self.timers),
+        }
+
+    def metrics(self):
+        if self.telemetry is None:
+            return {'gauges': self.gauges()}
+        return self.telemetry.snapshot(self.gauges())
+
+    def prometheus(self):
+        return to_prometheus(self.telemetry, self.gauges())
+
+    def dump_profiles(self, directory):
+        if self.profiler is None:
+            return []
+        return self.profiler.dump(directory)
+
+    def metrics_state(self):
+        return self.telemetry, self.gauges()
+
     @staticmethod
     def convert_id(value):
         if isinstance(value, UUID):
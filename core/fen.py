@@ -0,0 +1,128 @@
+from .bitboard import Position, to_pos, to_square
+from .figure import King, Queen, Rook, Bishop, Knight, Pawn
+from .tables import CASTLINGS
+from .utils import Colors, Validator
+
+
+INITIAL = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# Letter of every castling right bit, lowest first
+CASTLING_LETTERS = 'KQkq'
+
+FIGURES = {
+    'k': King, 'q': Queen, 'r': Rook, 'b': Bishop, 'n': Knight, 'p': Pawn,
+}
+
+
+def parse_fen(fen):
+    fields = fen.split()
+    if not 1 <= len(fields) <= 6:
+        raise ValueError(f'Invalid FEN: {fen!r}')
+    fields += ['w', '-', '-', '0', '1'][len(fields) - 1:]
+    placement, turn, castling, en_passant, halfmove, fullmove = fields
+
+    ranks = placement.split('/')
+    if len(ranks) != 8:
+        raise ValueError(f'Invalid FEN placement: {placement!r}')
+    squares = []
+    for rank in ranks:
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row += [None] * int(char)
+            elif char.lower() in FIGURES:
+                color = Colors.WHITE if char.isupper() else Colors.BLACK
+                row.append(FIGURES[char.lower()](color))
+            else:
+                raise ValueError(f'Invalid FEN piece: {char!r}')
+        if len(row) != 8:
+            raise ValueError(f'Invalid FEN rank: {rank!r}')
+        squares += row
+    kings = [figure for figure in squares if isinstance(figure, King)]
+    if sorted(king.color for king in kings) != [Colors.WHITE, Colors.BLACK]:
+        raise ValueError('FEN needs exactly one king per side')
+
+    if turn not in ('w', 'b'):
+        raise ValueError(f'Invalid FEN side to move: {turn!r}')
+    turn = Colors.WHITE if turn == 'w' else Colors.BLACK
+    return {
+        'squares': squares,
+        'turn': turn,
+        'castling': parse_castling(castling, squares),
+        'en_passant': parse_en_passant(en_passant, turn),
+        'halfmove': int(halfmove),
+        'fullmove': int(fullmove),
+    }
+
+
+def parse_castling(text, squares):
+    # Rights whose king or rook is not on its square are dropped
+    if text == '-':
+        return 0
+    if not text or any(char not in CASTLING_LETTERS for char in text):
+        raise ValueError(f'Invalid FEN castling rights: {text!r}')
+    rights = 0
+    for color, castlings in enumerate(CASTLINGS):
+        for right, king, _, rook, _, _, _ in castlings:
+            if (CASTLING_LETTERS[right.bit_length() - 1] in text and
+                    isinstance(squares[king], King) and
+                    squares[king].color == color and
+                    isinstance(squares[rook], Rook) and
+                    squares[rook].color == color):
+                rights |= right
+    return rights
+
+
+def castling_of(rights):
+    return ''.join(
+        letter for i, letter in enumerate(CASTLING_LETTERS) if rights >> i & 1
+    ) or '-'
+
+
+def parse_en_passant(text, turn):
+    if text == '-':
+        return None
+    pos = Validator.lookup_cellname(text)
+    # The skipped square is on the 6th rank for white to move, 3rd for black
+    if pos is None or pos[0] != (2 if turn == Colors.WHITE else 5):
+        raise ValueError(f'Invalid FEN en passant square: {text!r}')
+    return to_square(pos)
+
+
+def position_from_fen(fen):
+    data = parse_fen(fen)
+    position = Position.from_squares(data['squares'])
+    position.set_turn(data['turn'])
+    position.set_castling(data['castling'])
+    position.set_en_passant(data['en_passant'])
+    return position
+
+
+def placement_of(squares):
+    ranks = []
+    for i in range(0, 64, 8):
+        rank = ''
+        empty = 0
+        for figure in squares[i:i + 8]:
+            if figure is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            notation = figure.notation
+            rank += notation if figure.color == Colors.WHITE else notation.lower()
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    return '/'.join(ranks)
+
+
+def to_fen(squares, turn, castling=0, en_passant=None, halfmove=0,
+           fullmove=1):
+    if en_passant is None:
+        en_passant = '-'
+    else:
+        en_passant = Validator.pos_to_cellname(to_pos(en_passant)).lower()
+    side = 'w' if turn == Colors.WHITE else 'b'
+    return (f'{placement_of(squares)} {side} {castling_of(castling)} '
+            f'{en_passant} {halfmove} {fullmove}')
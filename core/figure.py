@@ -1,5 +1,20 @@
 from abc import ABCMeta, abstractmethod
-from utils import Validator, Colors
+from .utils import Colors
+from .bitboard import (
+    KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN,
+    Position, to_square, to_pos,
+)
+from .movegen import has_legal_move, legal_moves
+from .tables import (
+    KING_MOVES, QUEEN_MOVES, ROOK_MOVES, BISHOP_MOVES, KNIGHT_MOVES,
+    PAWN_MOVES, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS,
+    rook_attacks, bishop_attacks, queen_attacks,
+)
+
+
+# Status of a position whose side to move has no legal move but is not in
+# check
+STALEMATE = -2
 
 
 class PieceNames:
@@ -12,13 +27,29 @@ class PieceNames:
     KNIGHT = ('N', 'Knight')
 
 
-class Figure(metaclass=ABCMeta): # TODO: Implement Singleton for colors
+class Figure(metaclass=ABCMeta):
 
-    @abstractmethod
-    def __init__(self, color):
-        self.color = color
-        self.name = None
-        self.notation = None
+    # Pieces are immutable, so one instance per class and color is shared
+    # by every board
+    __slots__ = ('color',)
+    __instances = {}
+
+    name = None
+    notation = None
+
+    def __new__(cls, color):
+        figure = Figure.__instances.get((cls, color))
+        if figure is None:
+            figure = super().__new__(cls)
+            object.__setattr__(figure, 'color', color)
+            Figure.__instances[cls, color] = figure
+        return figure
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return type(self), (self.color,)
 
     @staticmethod
     @abstractmethod
@@ -29,26 +60,54 @@ class Figure(metaclass=ABCMeta): # TODO: Implement Singleton for colors
     def is_available_move(self, curr_pos, new_pos, board):
         pass
 
-    def can_move(self, curr_pos, new_pos, board):
+    @abstractmethod
+    def attacks(self, square, occupied):
+        pass
+
+    def targets(self, square, position):
+        return (self.attacks(square, position.all) &
+                ~position.occupied[self.color])
+
+    def can_move(self, curr_pos, new_pos, board, cache=None):
+        if isinstance(board, Position):
+            return self._can_move_on_position(curr_pos, new_pos, board)
         new_row, new_column = new_pos
         figure = board[new_row][new_column]
         if figure is not None and self.color == figure.color:
             return False
         if not self.is_available_move(curr_pos, new_pos, board):
             return False
-        board = self.make_move(curr_pos, new_pos, board)
-        return Figure.is_not_check(self.color, board)
-
-    def make_move(self, curr_pos, new_pos, board):
-        board = [row.copy() for row in board]
+        if cache is not None:
+            cache = self._cache_after_move(new_pos, cache)
         curr_row, curr_column = curr_pos
-        new_row, new_column = new_pos
         board[new_row][new_column] = self
         board[curr_row][curr_column] = None
-        return board
+        try:
+            return Figure.is_not_check(self.color, board, cache)
+        finally:
+            board[curr_row][curr_column] = self
+            board[new_row][new_column] = figure
+
+    def _can_move_on_position(self, curr_pos, new_pos, position):
+        start, target = to_square(curr_pos), to_square(new_pos)
+        if not self.targets(start, position) >> target & 1:
+            return False
+        return position.is_safe_move(start, target)
+
+    def _cache_after_move(self, new_pos, cache):
+        cache = cache.copy()
+        if isinstance(self, King):
+            cache['my_king_pos'] = new_pos
+        if new_pos in cache['opponent_figures']:
+            opponent_figures = cache['opponent_figures'].copy()
+            del opponent_figures[new_pos]
+            cache['opponent_figures'] = opponent_figures
+        return cache
 
     @staticmethod
     def collect_board_data(color, board):
+        if isinstance(board, Position):
+            return Figure._collect_position_data(color, board)
         my_figures = {}
         opponent_figures = {}
         my_king_pos = opp_king_pos = None
@@ -71,8 +130,29 @@ class Figure(metaclass=ABCMeta): # TODO: Implement Singleton for colors
             'opponent_figures': opponent_figures,
         }
 
+    @staticmethod
+    def _collect_position_data(color, position):
+        my_king = position.king_square(color)
+        opp_king = position.king_square(1 - color)
+        my_figures = {}
+        opponent_figures = {}
+        for square, figure in position.figures(color):
+            if square != my_king:
+                my_figures[to_pos(square)] = figure
+        for square, figure in position.figures(1 - color):
+            if square != opp_king:
+                opponent_figures[to_pos(square)] = figure
+        return {
+            'my_figures': my_figures,
+            'my_king_pos': to_pos(my_king),
+            'opp_king_pos': to_pos(opp_king),
+            'opponent_figures': opponent_figures,
+        }
+
     @staticmethod
     def is_not_check(color, board, cache=None) -> bool:
+        if isinstance(board, Position):
+            return not board.in_check(color)
         if cache is None:
             cache = Figure.collect_board_data(color, board)
 
@@ -90,7 +170,9 @@ class Figure(metaclass=ABCMeta): # TODO: Implement Singleton for colors
 
     @staticmethod
     def check_for_mate(color, board):
-        
+        if isinstance(board, Position):
+            return Figure._check_for_mate_on_position(color, board)
+
         data = Figure.collect_board_data(color, board)
         
         my_figures = data['my_figures']
@@ -101,32 +183,43 @@ class Figure(metaclass=ABCMeta): # TODO: Implement Singleton for colors
 
         my_king = board[my_king_pos[0]][my_king_pos[1]]
         for pos in my_king.possible_moves(my_king_pos, color):
-            if my_king.can_move(my_king_pos, pos, board):
+            if my_king.can_move(my_king_pos, pos, board, cache=data):
                 return
 
         for curr_pos, figure in my_figures.items():
             for pos in figure.possible_moves(curr_pos, color):
-                if figure.can_move(curr_pos, pos, board):
+                if figure.can_move(curr_pos, pos, board, cache=data):
                     return
 
         return color
 
+    @staticmethod
+    def _check_for_mate_on_position(color, position):
+        if not position.in_check(color):
+            return
+        for _ in legal_moves(position, color):
+            return
+        return color
+
+    @staticmethod
+    def game_status(color, position):
+        # Mate and stalemate from one search for a legal move: the losing
+        # color, STALEMATE, or None while `color` can move
+        if has_legal_move(position, color):
+            return
+        return color if position.in_check(color) else STALEMATE
+
 
 class King(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.KING[1]
-        self.notation = PieceNames.KING[0]
+    __slots__ = ()
+    kind = KING
+    name = PieceNames.KING[1]
+    notation = PieceNames.KING[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
-        curr_row, curr_column = curr_pos
-        up = [(curr_row - 1, curr_column + i) for i in range(-1, 2)]
-        curr = [(curr_row, curr_column + i) for i in range(-1, 2)]
-        down = [(curr_row + 1, curr_column + i) for i in range(-1, 2)]
-        moves = up + curr + down
-        return [pos for pos in moves if Validator.is_valid_pos(pos)]
+        return KING_MOVES[to_square(curr_pos)]
 
     def is_available_move(self, curr_pos, new_pos, board):
         curr_row, curr_column = curr_pos
@@ -135,19 +228,24 @@ class King(Figure):
         return (abs(curr_row - new_row) <= 1 and
             abs(curr_column - new_column) <= 1)
 
+    def attacks(self, square, occupied):
+        return KING_ATTACKS[square]
+
+    def targets(self, square, position):
+        return (super().targets(square, position) |
+                position.castling_targets(self.color))
+
 
 class Queen(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.QUEEN[1]
-        self.notation = PieceNames.QUEEN[0]
+    __slots__ = ()
+    kind = QUEEN
+    name = PieceNames.QUEEN[1]
+    notation = PieceNames.QUEEN[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
-        moves = Rook.possible_moves(curr_pos, color)
-        moves += Bishop.possible_moves(curr_pos, color)
-        return moves
+        return QUEEN_MOVES[to_square(curr_pos)]
 
     def is_available_move(self, curr_pos, new_pos, board):
         like_rook = Rook.is_valid_move(curr_pos, new_pos)
@@ -160,38 +258,30 @@ class Queen(Figure):
             cells = Bishop.get_cells_btw(curr_pos, new_pos, board)
         return not any(cells)
 
+    def attacks(self, square, occupied):
+        return queen_attacks(square, occupied)
+
 
 class Rook(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.ROOK[1]
-        self.notation = PieceNames.ROOK[0]
+    __slots__ = ()
+    kind = ROOK
+    name = PieceNames.ROOK[1]
+    notation = PieceNames.ROOK[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
-        curr_row, curr_column = curr_pos
-        moves = [(i, curr_column) for i in range(8) if i != curr_row]
-        moves += [(curr_row, i) for i in range(8) if i != curr_column]
-        return moves
+        return ROOK_MOVES[to_square(curr_pos)]
 
     @staticmethod
     def get_cells_btw(curr_pos, new_pos, board):
         curr_row, curr_column = curr_pos
         new_row, new_column = new_pos
         if curr_column == new_column:
-            test_board = list(zip(*board))
-            curr, new = curr_row, new_row
-            row = curr_column
-        else:
-            test_board = board
-            curr, new = curr_column, new_column
-            row = curr_row
-        if curr < new:
-            low, high = curr, new
-        else:
-            low, high = new, curr
-        return test_board[row][low + 1:high]
+            low, high = sorted((curr_row, new_row))
+            return [board[row][curr_column] for row in range(low + 1, high)]
+        low, high = sorted((curr_column, new_column))
+        return board[curr_row][low + 1:high]
 
     @staticmethod
     def is_valid_move(curr_pos, new_pos):
@@ -206,30 +296,20 @@ class Rook(Figure):
             return False
         return not any(self.get_cells_btw(curr_pos, new_pos, board))
 
+    def attacks(self, square, occupied):
+        return rook_attacks(square, occupied)
+
 
 class Bishop(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.BISHOP[1]
-        self.notation = PieceNames.BISHOP[0]
+    __slots__ = ()
+    kind = BISHOP
+    name = PieceNames.BISHOP[1]
+    notation = PieceNames.BISHOP[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
-        curr_row, curr_column = curr_pos
-        asc_column_start = curr_column - curr_row
-        desc_column_start = curr_column + curr_row
-        moves = []
-        for row in range(8):
-            if row == curr_row:
-                continue
-            asc_pos = asc_column_start + row, row
-            desc_pos = desc_column_start - row, row
-            if Validator.is_valid_pos(asc_pos):
-                moves.append(asc_pos)
-            if Validator.is_valid_pos(desc_pos):
-                moves.append(desc_pos)
-        return moves
+        return BISHOP_MOVES[to_square(curr_pos)]
 
     @staticmethod
     def get_cells_btw(curr_pos, new_pos, board):
@@ -259,51 +339,41 @@ class Bishop(Figure):
             return False
         return not any(self.get_cells_btw(curr_pos, new_pos, board))
 
+    def attacks(self, square, occupied):
+        return bishop_attacks(square, occupied)
+
 
 class Knight(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.KNIGHT[1]
-        self.notation = PieceNames.KNIGHT[0]
+    __slots__ = ()
+    kind = KNIGHT
+    name = PieceNames.KNIGHT[1]
+    notation = PieceNames.KNIGHT[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
-        curr_row, curr_column = curr_pos
-        up = [(curr_row + 2, curr_column - 1), (curr_row + 2, curr_column + 1)]
-        down = [(curr_row - 2, curr_column - 1), (curr_row - 2, curr_column + 1)]
-        left = [(curr_row - 1, curr_column - 2), (curr_row + 1, curr_column - 2)]
-        right = [(curr_row - 1, curr_column + 2), (curr_row + 1, curr_column + 2)]
-        moves = up + down + left + right
-        return [pos for pos in moves if Validator.is_valid_pos(pos)]
+        return KNIGHT_MOVES[to_square(curr_pos)]
 
     def is_available_move(self, curr_pos, new_pos, board):
-        return new_pos in self.possible_moves(curr_pos, self.color)
+        square = to_square(curr_pos)
+        return bool(KNIGHT_ATTACKS[square] >> to_square(new_pos) & 1)
+
+    def attacks(self, square, occupied):
+        return KNIGHT_ATTACKS[square]
 
 
 class Pawn(Figure):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.name = PieceNames.PAWN[1]
-        self.notation = PieceNames.PAWN[0]
+    __slots__ = ()
+    kind = PAWN
+    name = PieceNames.PAWN[1]
+    notation = PieceNames.PAWN[0]
 
     @staticmethod
     def possible_moves(curr_pos, color=None):
         if color is None:
-            return []
-        curr_row, curr_column = curr_pos
-        is_new_black = color == 1 and curr_row == 1
-        is_new_white = color == 0 and curr_row == 6
-        moves = [
-            (curr_row - (-1) ** color, curr_column),
-            (curr_row - (-1) ** color, curr_column - 1),
-            (curr_row - (-1) ** color, curr_column + 1),
-        ]
-        if is_new_black or is_new_white:
-            moves.append((curr_row - (2 * (-1) ** color), curr_column))
-        # TODO: Need to add checker for `en passant`
-        return [pos for pos in moves if Validator.is_valid_pos(pos)]
+            return ()
+        return PAWN_MOVES[color][to_square(curr_pos)]
 
     def is_available_move(self, curr_pos, new_pos, board):
         _, curr_column = curr_pos
@@ -315,6 +385,27 @@ class Pawn(Figure):
                 acceptables.append(p)
         return new_pos in acceptables
 
+    def attacks(self, square, occupied):
+        return PAWN_ATTACKS[self.color][square]
+
+    def targets(self, square, position):
+        result = (self.attacks(square, position.all) &
+                  position.occupied[1 - self.color])
+        en_passant = position.en_passant
+        if (en_passant is not None and position.turn == self.color and
+                self.attacks(square, 0) >> en_passant & 1):
+            result |= 1 << en_passant
+        forward = -8 if self.color == Colors.WHITE else 8
+        one_step = square + forward
+        if not 0 <= one_step < 64 or position.all >> one_step & 1:
+            return result
+        result |= 1 << one_step
+        start_row = 6 if self.color == Colors.WHITE else 1
+        two_steps = one_step + forward
+        if square // 8 == start_row and not position.all >> two_steps & 1:
+            result |= 1 << two_steps
+        return result
+
 
 ORDER = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
 PAWNS = [Pawn] * 8
@@ -0,0 +1,195 @@
+import os
+import struct
+import time
+from threading import Thread
+from uuid import UUID
+
+from .archive import MOVE as PACKED_MOVE
+from .archive import decode_move, encode_move, pack_moves, unpack_moves
+from .board import Board
+
+
+NEW, MOVE, END, UNDO = range(1, 5)
+# operation, board id, packed move
+RECORD = struct.Struct('<B16sH')
+
+SNAPSHOT_MAGIC = b'CHSS\x01'
+# journal generation the snapshot continues with, number of boards
+SNAPSHOT_HEADER = struct.Struct('<II')
+# board id, number of moves
+SNAPSHOT_BOARD = struct.Struct('<16sH')
+
+
+class Journal:
+
+    def __init__(self, directory, sync_every=64, snapshot_every=100_000,
+                 sync_seconds=0.05, clock=time.monotonic):
+        self.directory = directory
+        # Buffered records are written once `sync_every` of them pile up,
+        # or by `sync_due` once the oldest one waited `sync_seconds`
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.snapshot_every = snapshot_every
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        self.__generation = self.__snapshot_generation()
+        self.__file = None
+        self.__buffer = []
+        self.__buffered_at = None
+        self.__records = 0
+        self.__writer = None
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, 'snapshot.bin')
+
+    def journal_path(self, generation):
+        return os.path.join(self.directory, f'journal-{generation:08d}.log')
+
+    def __snapshot_generation(self):
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, 'rb') as file:
+            header = file.read(len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size)
+        generation, _ = SNAPSHOT_HEADER.unpack_from(header, len(SNAPSHOT_MAGIC))
+        return generation
+
+    def __journal_generations(self):
+        generations = []
+        for name in os.listdir(self.directory):
+            if name.startswith('journal-') and name.endswith('.log'):
+                generations.append(int(name[len('journal-'):-len('.log')]))
+        return sorted(generations)
+
+    def restore(self, cache=None, telemetry=None):
+        games = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as file:
+                data = file.read()
+            offset = len(SNAPSHOT_MAGIC)
+            _, count = SNAPSHOT_HEADER.unpack_from(data, offset)
+            offset += SNAPSHOT_HEADER.size
+            for _ in range(count):
+                board_id, moves = SNAPSHOT_BOARD.unpack_from(data, offset)
+                offset += SNAPSHOT_BOARD.size
+                end = offset + moves * PACKED_MOVE.size
+                games[board_id] = unpack_moves(data[offset:end])
+                offset = end
+
+        for generation in self.__journal_generations():
+            if generation < self.__generation:
+                continue
+            with open(self.journal_path(generation), 'rb') as file:
+                data = file.read()
+            # A torn last record from a crash is ignored
+            usable = len(data) - len(data) % RECORD.size
+            for op, board_id, move in RECORD.iter_unpack(data[:usable]):
+                if op == NEW:
+                    games[board_id] = []
+                elif op == MOVE and board_id in games:
+                    games[board_id].append(decode_move(move)[:2])
+                elif op == END:
+                    games.pop(board_id, None)
+                elif op == UNDO and games.get(board_id):
+                    games[board_id].pop()
+
+        boards = {}
+        for board_id, moves in games.items():
+            board_id = UUID(bytes=board_id)
+            boards[board_id] = Board.restore(
+                board_id, moves, cache, telemetry,
+            )
+        return boards
+
+    def __append(self, op, board_id, move=0):
+        if not self.__buffer:
+            self.__buffered_at = self.clock()
+        self.__buffer.append(RECORD.pack(op, board_id.bytes, move))
+        self.__records += 1
+        if len(self.__buffer) >= self.sync_every:
+            self.sync()
+
+    def new_board(self, board_id):
+        self.__append(NEW, board_id)
+
+    def move(self, board_id, start, target):
+        self.__append(MOVE, board_id, encode_move(start, target))
+
+    def end_board(self, board_id):
+        self.__append(END, board_id)
+
+    def undo(self, board_id):
+        self.__append(UNDO, board_id)
+
+    def sync(self):
+        if not self.__buffer:
+            return
+        if self.__file is None:
+            path = self.journal_path(self.__generation)
+            self.__file = open(path, 'ab')
+        self.__file.write(b''.join(self.__buffer))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__buffer.clear()
+
+    def sync_due(self):
+        if (self.__buffer and
+                self.clock() - self.__buffered_at >= self.sync_seconds):
+            self.sync()
+
+    @property
+    def needs_snapshot(self):
+        return self.__records >= self.snapshot_every and not self.snapshotting
+
+    @property
+    def snapshotting(self):
+        return self.__writer is not None and self.__writer.is_alive()
+
+    def snapshot(self, games, background=False):
+        # `games` holds the board id and square pairs of every live board.
+        # Later records go to a new generation at once, while older ones are
+        # removed only after the snapshot replaced the previous one, so a
+        # crash during a background write restores from the old snapshot.
+        self.wait_snapshot()
+        self.sync()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__generation += 1
+        self.__records = 0
+        if background:
+            self.__writer = Thread(
+                target=self.__write_snapshot,
+                args=(self.__generation, games),
+            )
+            self.__writer.start()
+        else:
+            self.__write_snapshot(self.__generation, games)
+
+    def wait_snapshot(self):
+        if self.__writer is not None:
+            self.__writer.join()
+            self.__writer = None
+
+    def __write_snapshot(self, generation, games):
+        parts = [SNAPSHOT_MAGIC, SNAPSHOT_HEADER.pack(generation, len(games))]
+        for board_id, moves in games:
+            parts.append(SNAPSHOT_BOARD.pack(board_id.bytes, len(moves)))
+            parts.append(pack_moves(moves))
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(b''.join(parts))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+
+        for old in self.__journal_generations():
+            if old < generation:
+                os.remove(self.journal_path(old))
+
+    def close(self):
+        self.wait_snapshot()
+        self.sync()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
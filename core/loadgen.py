@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import json
+import time
+
+from .server import Server
+from .controller import Controller
+
+
+# A short opening line that every simulated game plays
+OPENING = [
+    ('e2', 'e4'), ('e7', 'e5'), ('g1', 'f3'), ('b8', 'c6'),
+    ('f1', 'b5'), ('a7', 'a6'), ('b5', 'a4'), ('g8', 'f6'),
+    ('e1', 'f1'), ('f8', 'e7'), ('f1', 'e1'), ('b7', 'b5'),
+]
+
+
+class Client:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request_id = 0
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def request(self, op, *args):
+        self.request_id += 1
+        payload = {'id': self.request_id, 'op': op, 'args': list(args)}
+        self.writer.write(json.dumps(payload).encode() + b'\n')
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def play(client, games, latencies):
+    for _ in range(games):
+        started = time.perf_counter()
+        board_id = await client.request('new-board')
+        latencies.append(time.perf_counter() - started)
+        for from_cell, target_cell in OPENING:
+            started = time.perf_counter()
+            await client.request('move', board_id, from_cell, target_cell)
+            latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await client.request('end', board_id)
+        latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def run(host, port, clients, games):
+    connections = [await Client.connect(host, port) for _ in range(clients)]
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(play(c, games, latencies) for c in connections))
+    elapsed = time.perf_counter() - started
+    for connection in connections:
+        await connection.close()
+    return {
+        'clients': clients,
+        'games': clients * games,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 6),
+        'requests_per_second': round(len(latencies) / elapsed),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run_local(clients, games):
+    server = Server(Controller(), port=0)
+    await server.start()
+    try:
+        return await run(server.host, server.port, clients, games)
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.loadgen',
+        description='Generate load against the JSON-lines server',
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--games', type=int, default=10,
+                        help='Games each client plays')
+    parser.add_argument('--local', action='store_true',
+                        help='Start an in-process server to test against')
+    args = parser.parse_args(argv)
+
+    if args.local:
+        report = asyncio.run(run_local(args.clients, args.games))
+    else:
+        report = asyncio.run(
+            run(args.host, args.port, args.clients, args.games)
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from .board import Board
+from .controller import Controller
+from .utils import Validator
+
+
+def random_game(plies, rng):
+    board = Board(None)
+    moves = []
+    for _ in range(plies):
+        legal = list(board.legal_moves())
+        if not legal:
+            break
+        start, target = rng.choice(legal)
+        board.make_move(start, target)
+        moves.append((
+            Validator.pos_to_cellname(start),
+            Validator.pos_to_cellname(target),
+        ))
+        if board.is_over:
+            break
+    return moves
+
+
+def measure(boards=1000, plies=40, seed=0):
+    # Games are generated up front, since tracing slows every allocation
+    rng = random.Random(seed)
+    games = [random_game(plies, rng) for _ in range(boards)]
+    # The result cache is shared by every board, so it is left out
+    controller = Controller(cache_bytes=0)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    for moves in games:
+        board_id = controller.start_new_board()
+        for from_cell, target_cell in moves:
+            controller.make_move(board_id, from_cell, target_cell)
+    elapsed = time.perf_counter() - started
+    games = None
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    live = len(controller.boards)
+    total_plies = sum(
+        board.plies for board in controller.boards.resident().values()
+    )
+    used = after - before
+    controller.close()
+    return {
+        'boards': live,
+        'finished': boards - live,
+        'plies': total_plies,
+        'bytes': used,
+        'peak_bytes': peak - before,
+        'bytes_per_board': round(used / max(live, 1)),
+        'seconds': round(elapsed, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.memory',
+        description='Report the memory used by every live board',
+    )
+    parser.add_argument('--boards', type=int, default=1000)
+    parser.add_argument('--plies', type=int, default=40,
+                        help='Random plies played on each board')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    print(json.dumps(measure(args.boards, args.plies, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
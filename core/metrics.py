@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+
+# Latency bucket upper bounds in seconds, four per doubling from 1us to ~2min
+BOUNDS = tuple(1e-6 * 2 ** (i / 4) for i in range(108))
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+class Histogram:
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = BOUNDS[i - 1] if i else 0.0
+                high = BOUNDS[i] if i < len(BOUNDS) else self.max
+                # Interpolated inside the bucket, never above the maximum
+                value = low + (high - low) * (rank - seen) / count
+                return min(value, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        result = {'count': self.count, 'total': self.total, 'max': self.max}
+        for name, fraction in QUANTILES:
+            result[name] = self.percentile(fraction)
+        return result
+
+
+class Metrics:
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def merge(self, other):
+        for name, value in other.counters.items():
+            self.incr(name, value)
+        for name, histogram in other.histograms.items():
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].merge(histogram)
+
+    def snapshot(self, gauges=None):
+        return {
+            'counters': dict(self.counters),
+            'latency': {
+                name: histogram.summary()
+                for name, histogram in sorted(self.histograms.items())
+            },
+            'gauges': dict(gauges or {}),
+        }
+
+
+def timed(name):
+    # Times a method of an object whose `telemetry` may be None
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            telemetry = self.telemetry
+            if telemetry is None:
+                return method(self, *args, **kwargs)
+            started = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                telemetry.observe(name, perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def to_prometheus(metrics, gauges=None, prefix='chess'):
+    lines = []
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f'# TYPE {prefix}_{name} gauge')
+        lines.append(f'{prefix}_{name} {value}')
+    if metrics is None:
+        return '\n'.join(lines) + '\n'
+
+    for name, value in sorted(metrics.counters.items()):
+        metric = f"{prefix}_{name.replace('.', '_')}_total"
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {value}')
+
+    metric = f'{prefix}_latency_seconds'
+    if metrics.histograms:
+        lines.append(f'# TYPE {metric} histogram')
+    for name, histogram in sorted(metrics.histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BOUNDS, histogram.counts):
+            cumulative += count
+            lines.append(
+                f'{metric}_bucket{{op="{name}",le="{bound:.9g}"}} '
+                f'{cumulative}'
+            )
+        lines.append(
+            f'{metric}_bucket{{op="{name}",le="+Inf"}} {histogram.count}'
+        )
+        lines.append(f'{metric}_sum{{op="{name}"}} {histogram.total:.9g}')
+        lines.append(f'{metric}_count{{op="{name}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
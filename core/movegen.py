@@ -0,0 +1,120 @@
+from .bitboard import QUEEN, ROOK, BISHOP, KNIGHT, PAWN, squares_of
+from .tables import (
+    BETWEEN, BISHOP_LINES, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS,
+    ROOK_LINES,
+    rook_attacks, bishop_attacks,
+)
+from .utils import Colors
+
+
+BOARD = (1 << 64) - 1
+
+
+def attacked_squares(position, color, occupied):
+    pieces = position.pieces[color]
+    result = KING_ATTACKS[position.kings[color]]
+    pawn_attacks = PAWN_ATTACKS[color]
+    for square in squares_of(pieces[PAWN]):
+        result |= pawn_attacks[square]
+    for square in squares_of(pieces[KNIGHT]):
+        result |= KNIGHT_ATTACKS[square]
+    for square in squares_of(pieces[ROOK] | pieces[QUEEN]):
+        result |= rook_attacks(square, occupied)
+    for square in squares_of(pieces[BISHOP] | pieces[QUEEN]):
+        result |= bishop_attacks(square, occupied)
+    return result
+
+
+def pinned_pieces(position, color):
+    king = position.kings[color]
+    own = position.occupied[color]
+    occupied = own | position.occupied[1 - color]
+    pieces = position.pieces[1 - color]
+    snipers = (
+        rook_attacks(king, 0) & (pieces[ROOK] | pieces[QUEEN]) |
+        bishop_attacks(king, 0) & (pieces[BISHOP] | pieces[QUEEN])
+    )
+    pins = {}
+    between = BETWEEN[king]
+    for sniper in squares_of(snipers):
+        blockers = between[sniper] & occupied
+        if blockers & own and not blockers & (blockers - 1):
+            pins[blockers.bit_length() - 1] = between[sniper] | 1 << sniper
+    return pins
+
+
+def legal_moves(position, color):
+    king = position.kings[color]
+    own = position.occupied[color]
+    occupied = own | position.occupied[1 - color]
+    danger = attacked_squares(position, 1 - color, occupied ^ 1 << king)
+    for target in squares_of(KING_ATTACKS[king] & ~own & ~danger):
+        yield king, target
+
+    checkers = position.attackers(king, 1 - color)
+    if checkers & (checkers - 1):
+        return
+    if checkers:
+        allowed = checkers | BETWEEN[king][checkers.bit_length() - 1]
+    else:
+        allowed = ~own
+        for target in squares_of(position.castling_targets(color, danger)):
+            yield king, target
+    pins = pinned_pieces(position, color)
+    squares = position.squares
+    # En passant takes two pawns off one rank, which the pin masks miss,
+    # so those captures are checked by playing them
+    en_passant = position.en_passant
+    capturers = 0
+    if en_passant is not None and color == position.turn:
+        capturers = (PAWN_ATTACKS[1 - color][en_passant] &
+                     position.pieces[color][PAWN])
+        for start in squares_of(capturers):
+            if position.is_safe_move(start, en_passant):
+                yield start, en_passant
+    for start in squares_of(own ^ 1 << king):
+        targets = squares[start].targets(start, position) & allowed
+        if capturers >> start & 1:
+            targets &= ~(1 << en_passant)
+        if start in pins:
+            targets &= pins[start]
+        for target in squares_of(targets):
+            yield start, target
+
+
+def has_legal_move(position, color):
+    # Stops at the first move that leaves the king safe. Out of check that
+    # is far cheaper than setting up the attack and pin masks.
+    if position.in_check(color):
+        return next(legal_moves(position, color), None) is not None
+    squares = position.squares
+    king = position.kings[color]
+    own = position.occupied[color]
+    pieces = position.pieces[1 - color]
+    # Only pieces between the king and an enemy slider on the same line can
+    # be pinned, so any target of the others is legal
+    snipers = (
+        ROOK_LINES[king] & (pieces[ROOK] | pieces[QUEEN]) |
+        BISHOP_LINES[king] & (pieces[BISHOP] | pieces[QUEEN])
+    )
+    free = own & ~(1 << king)
+    for sniper in squares_of(snipers):
+        free &= ~BETWEEN[king][sniper]
+    # One step of a free pawn settles most positions without a loop
+    pawns = free & position.pieces[color][PAWN]
+    pushes = pawns >> 8 if color == Colors.WHITE else pawns << 8
+    if pushes & ~(own | position.occupied[1 - color]) & BOARD:
+        return True
+    # En passant takes a second pawn off the board, so it is played
+    en_passant = position.en_passant
+    unsure = 0 if en_passant is None else 1 << en_passant
+    for start in squares_of(free):
+        targets = squares[start].targets(start, position)
+        if targets & ~unsure or targets and position.is_safe_move(
+                start, en_passant):
+            return True
+    for start in squares_of(own & ~free):
+        for target in squares_of(squares[start].targets(start, position)):
+            if position.is_safe_move(start, target):
+                return True
+    return False
@@ -0,0 +1,138 @@
+import argparse
+import json
+import sys
+import time
+
+from .bitboard import to_pos, squares_of
+from .fen import position_from_fen as fen_position
+from .movegen import legal_moves
+from .utils import Validator
+
+# Positions with published node counts. Depths are limited to the rules
+# the engine implements, so none of the counted lines needs promotion.
+SUITE = [
+    {
+        'name': 'initial',
+        'fen': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -',
+        'nodes': [20, 400, 8902, 197281],
+    },
+    {
+        'name': 'kiwipete',
+        'fen': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/'
+                '1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -'),
+        'nodes': [48, 2039, 97862],
+    },
+    {
+        'name': 'endgame',
+        'fen': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+        'nodes': [14, 191, 2812, 43238],
+    },
+    {
+        'name': 'middlegame',
+        'fen': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/'
+                '2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - -'),
+        'nodes': [46, 2079, 89890, 3894594],
+    },
+]
+
+
+def position_from_fen(fen):
+    position = fen_position(fen)
+    return position, position.turn
+
+
+def figure_moves(position, color):
+    for start, figure in position.figures(color):
+        for target in squares_of(figure.targets(start, position)):
+            if position.is_safe_move(start, target):
+                yield start, target
+
+
+GENERATORS = {
+    'movegen': legal_moves,
+    'figure': figure_moves,
+}
+
+
+def perft(position, color, depth, generator=legal_moves):
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return sum(1 for _ in generator(position, color))
+    nodes = 0
+    for start, target in list(generator(position, color)):
+        undo = position.make_move(start, target)
+        nodes += perft(position, 1 - color, depth - 1, generator)
+        position.unmake_move(undo)
+    return nodes
+
+
+def divide(position, color, depth, generator=legal_moves):
+    result = {}
+    for start, target in list(generator(position, color)):
+        undo = position.make_move(start, target)
+        name = (Validator.pos_to_cellname(to_pos(start)) +
+                Validator.pos_to_cellname(to_pos(target)))
+        result[name.lower()] = perft(position, 1 - color, depth - 1, generator)
+        position.unmake_move(undo)
+    return result
+
+
+def run_suite(max_depth=3, generator='movegen', suite=SUITE):
+    report = {'generator': generator, 'results': [], 'passed': True}
+    for entry in suite:
+        position, color = position_from_fen(entry['fen'])
+        for depth, expected in enumerate(entry['nodes'][:max_depth], 1):
+            started = time.perf_counter()
+            nodes = perft(position, color, depth, GENERATORS[generator])
+            elapsed = time.perf_counter() - started
+            passed = nodes == expected
+            report['passed'] &= passed
+            report['results'].append({
+                'name': entry['name'],
+                'depth': depth,
+                'nodes': nodes,
+                'expected': expected,
+                'passed': passed,
+                'seconds': round(elapsed, 6),
+                'nps': round(nodes / elapsed) if elapsed else None,
+            })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.perft',
+        description='Count move-tree leaves and benchmark move generation',
+    )
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--generator', choices=GENERATORS, default='movegen')
+    parser.add_argument('--fen', help='Run divide on this position instead')
+    parser.add_argument('--json', action='store_true',
+                        help='Print a machine-readable report')
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        position, color = position_from_fen(args.fen)
+        result = divide(position, color, args.depth, GENERATORS[args.generator])
+        if args.json:
+            print(json.dumps({'divide': result, 'nodes': sum(result.values())}))
+        else:
+            for move, nodes in sorted(result.items()):
+                print(f'{move}: {nodes}')
+            print(f'\nNodes: {sum(result.values())}')
+        return 0
+
+    report = run_suite(args.depth, args.generator)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for item in report['results']:
+            status = 'ok' if item['passed'] else 'FAIL'
+            print(f"{item['name']:<12} depth {item['depth']} "
+                  f"{item['nodes']:>9} nodes {item['nps']:>9} nps  {status}")
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
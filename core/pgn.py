@@ -0,0 +1,189 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from .bitboard import (
+    KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN,
+    squares_of, to_square,
+)
+from .fen import INITIAL, position_from_fen
+from .movegen import legal_moves
+from .utils import Validator
+
+
+KINDS = {'K': KING, 'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT}
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+CASTLING = {'O-O': 2, '0-0': 2, 'O-O-O': -2, '0-0-0': -2}
+
+SAN = re.compile(
+    r'^(?P<piece>[KQRBN])?(?P<file>[a-h])?(?P<rank>[1-8])?x?'
+    r'(?P<target>[a-h][1-8])(?:=?(?P<promotion>[QRBN]))?$'
+)
+TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+TOKENS = re.compile(r'\{[^}]*\}?|\}|;.*|\(|\)|\$\d+|[^\s(){};]+')
+
+
+class PGNError(ValueError):
+    pass
+
+
+def _tokens(text, state):
+    for token in TOKENS.findall(text):
+        if state['comment']:
+            if token.endswith('}'):
+                state['comment'] = False
+            continue
+        if token.startswith('{'):
+            state['comment'] = not token.endswith('}')
+            continue
+        if token.startswith(';') or token.startswith('$'):
+            continue
+        if token == '(':
+            state['variation'] += 1
+            continue
+        if token == ')':
+            state['variation'] -= 1
+            continue
+        if state['variation']:
+            continue
+        yield token
+
+
+def read_games(lines):
+    tags = {}
+    moves = []
+    result = None
+    state = {'comment': False, 'variation': 0}
+    for line in lines:
+        line = line.strip()
+        if not state['comment'] and (match := TAG.match(line)):
+            if moves or result is not None:
+                yield {'tags': tags, 'moves': moves, 'result': result}
+                tags, moves, result = {}, [], None
+            tags[match[1]] = match[2]
+            continue
+        for token in _tokens(line, state):
+            if token in RESULTS:
+                result = token
+                continue
+            if token[0].isdigit() or token[0] == '.':
+                # Move numbers, either alone or glued to the move
+                token = token.rsplit('.', 1)[-1]
+            if token:
+                moves.append(token)
+    if tags or moves:
+        yield {'tags': tags, 'moves': moves, 'result': result}
+
+
+def parse_san(position, san):
+    squares = position.squares
+    san = san.rstrip('+#!?')
+    if san in CASTLING:
+        start = position.kings[position.turn]
+        target = start + CASTLING[san]
+        candidates = [
+            move for move in legal_moves(position, position.turn)
+            if move == (start, target)
+        ]
+    else:
+        match = SAN.match(san)
+        if not match:
+            raise PGNError(f'Invalid move: {san!r}')
+        if match['promotion']:
+            raise PGNError(f'Promotion is not supported: {san!r}')
+        kind = KINDS.get(match['piece'], PAWN)
+        target = to_square(Validator.lookup_cellname(match['target']))
+        file = match['file'] and 'abcdefgh'.index(match['file'])
+        rank = match['rank'] and 8 - int(match['rank'])
+        candidates = [
+            (start, target)
+            for start in squares_of(position.pieces[position.turn][kind])
+            if (file is None or start % 8 == file) and
+            (rank is None or start // 8 == rank) and
+            squares[start].targets(start, position) >> target & 1 and
+            position.is_safe_move(start, target)
+        ]
+    if len(candidates) != 1:
+        raise PGNError(f'Illegal or ambiguous move: {san!r}')
+    return candidates[0]
+
+
+def replay(game):
+    position = position_from_fen(game['tags'].get('FEN', INITIAL))
+    for san in game['moves']:
+        position.make_move(*parse_san(position, san))
+    return position
+
+
+def _ranged_lines(file, start, end):
+    # Yields the lines of the games whose [Event tag starts in the range
+    if start:
+        file.seek(start - 1)
+        file.readline()
+    started = not start
+    while True:
+        offset = file.tell()
+        line = file.readline()
+        if not line:
+            return
+        if line.startswith(b'[Event '):
+            if end is not None and offset >= end:
+                return
+            started = True
+        if started:
+            yield line.decode('utf-8', 'replace')
+
+
+def _ingest(path, start=0, end=None):
+    report = {'games': 0, 'errors': 0, 'plies': 0}
+    with open(path, 'rb') as file:
+        for game in read_games(_ranged_lines(file, start, end)):
+            report['games'] += 1
+            try:
+                replay(game)
+            except ValueError:
+                report['errors'] += 1
+                continue
+            report['plies'] += len(game['moves'])
+    return report
+
+
+def ingest(path, workers=1):
+    started = time.perf_counter()
+    if workers <= 1:
+        report = _ingest(path)
+    else:
+        size = os.path.getsize(path)
+        step = size // workers + 1
+        ranges = [(path, i * step, (i + 1) * step) for i in range(workers)]
+        with multiprocessing.Pool(workers) as pool:
+            parts = pool.starmap(_ingest, ranges)
+        report = {
+            key: sum(part[key] for part in parts)
+            for key in ('games', 'errors', 'plies')
+        }
+    elapsed = time.perf_counter() - started
+    report['workers'] = max(workers, 1)
+    report['seconds'] = round(elapsed, 6)
+    report['games_per_second'] = round(report['games'] / elapsed, 1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.pgn',
+        description='Replay every game of a PGN file through the engine',
+    )
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(ingest(args.path, args.workers), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
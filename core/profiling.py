@@ -0,0 +1,111 @@
+import argparse
+import cProfile
+import heapq
+import json
+import os
+import pstats
+import random
+from itertools import count
+from time import perf_counter
+
+from .board import Board
+from .utils import Validator
+
+
+class MoveProfiler:
+
+    INDEX = 'profiles.json'
+
+    def __init__(self, rate=0.01, keep=10, seed=None):
+        self.rate = rate
+        self.keep = keep
+        self.sampled = 0
+        self.__random = random.Random(seed)
+        # Min-heap of the slowest profiles, the fastest one is replaced
+        self.__slowest = []
+        self.__order = count()
+
+    def sample(self):
+        return self.rate > 0 and self.__random.random() < self.rate
+
+    def run(self, fen, move, function, *args):
+        profile = cProfile.Profile()
+        started = perf_counter()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            self.sampled += 1
+            self.__record(perf_counter() - started, profile, fen, move)
+
+    def __record(self, seconds, profile, fen, move):
+        if self.keep <= 0:
+            return
+        entry = (seconds, next(self.__order), profile, fen, move)
+        if len(self.__slowest) < self.keep:
+            heapq.heappush(self.__slowest, entry)
+        elif seconds > self.__slowest[0][0]:
+            heapq.heapreplace(self.__slowest, entry)
+
+    def slowest(self):
+        return [
+            {'seconds': seconds, 'fen': fen, 'move': list(move),
+             'profile': profile}
+            for seconds, _, profile, fen, move in
+            sorted(self.__slowest, reverse=True)
+        ]
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        index = []
+        for rank, entry in enumerate(self.slowest(), start=1):
+            name = f"{rank:03d}-{entry['seconds'] * 1000:.3f}ms.prof"
+            entry.pop('profile').dump_stats(os.path.join(directory, name))
+            index.append({'file': name, **entry})
+        with open(os.path.join(directory, self.INDEX), 'w') as file:
+            json.dump(index, file, indent=2)
+        return [os.path.join(directory, entry['file']) for entry in index]
+
+    def clear(self):
+        self.__slowest.clear()
+
+
+def profile_move(fen, from_cell, target_cell):
+    # Replays a saved position and move under the profiler
+    board = Board.from_fen(None, fen)
+    from_pos = Validator.lookup_cellname(from_cell)
+    target_pos = Validator.lookup_cellname(target_cell)
+    profile = cProfile.Profile()
+    result = profile.runcall(board.make_move, from_pos, target_pos)
+    return result, pstats.Stats(profile)
+
+
+def main(argv=None):
+    from .controller import Controller
+    from .memory import random_game
+
+    parser = argparse.ArgumentParser(
+        prog='python -m core.profiling',
+        description='Profile sampled moves of random games',
+    )
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--plies', type=int, default=80)
+    parser.add_argument('--rate', type=float, default=0.1)
+    parser.add_argument('--keep', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='profiles')
+    args = parser.parse_args(argv)
+
+    profiler = MoveProfiler(args.rate, args.keep, args.seed)
+    controller = Controller(profiler=profiler)
+    rng = random.Random(args.seed)
+    for _ in range(args.games):
+        board_id = controller.start_new_board()
+        for from_cell, target_cell in random_game(args.plies, rng):
+            controller.make_move(board_id, from_cell, target_cell)
+    paths = controller.dump_profiles(args.out)
+    controller.close()
+    print(json.dumps({'sampled': profiler.sampled, 'files': paths}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
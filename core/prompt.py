@@ -1,6 +1,4 @@
-import os
-
-from .figure import TEXT_FIGURES
+from .renderer import TerminalRenderer
 from .utils import COLOR_NAMES, Validator
 
 class PromptCLI:
@@ -14,6 +12,12 @@ class PromptCLI:
         "To see current board id enter 'current'\n"
         "To remove the board enter 'remove-board <board id>'\n"
         "To choose the board enter 'set-board <board id>'\n"
+        "To get a suggested move enter 'hint'\n"
+        "To see the moves of the board enter 'moves'\n"
+        "To take back the last move enter 'undo', to replay it 'redo'\n"
+        "To see operation counts and latencies enter 'stats'\n"
+        "To start a timed board enter 'new-timed-board <minutes>'\n"
+        "To see the time left enter 'clock'\n"
         "\n"
         "To make move enter '<FROM> <TO>', where\n"
         "<FROM> and <TO> should be represented as square notations\n\n"
@@ -24,25 +28,119 @@ class PromptCLI:
     )
 
 
-    def __init__(self, controller):
+    FOOTER = "To see all commands enter 'help'"
+
+    def __init__(self, controller, renderer=None):
         self._ctrl = controller
+        self._renderer = renderer or TerminalRenderer()
         self._curr_board_id = self._ctrl.start_new_board()
 
 
         self._base_commands = {
             'set-board': self.set_current_board,
             'remove-board': self._ctrl.end_board,
+            'new-timed-board': self.create_timed_board,
         }
         self._unar_commands = {
             'help': self.show_help,
             'current': self.get_current_board,
             'boards': self.show_all_boards,
             'new-board': self.create_new_board,
+            'hint': self.show_hint,
+            'moves': self.show_moves,
+            'undo': self.undo_move,
+            'redo': self.redo_move,
+            'stats': self.show_stats,
+            'clock': self.show_clock,
         }
 
     def create_new_board(self):
         self._curr_board_id = self._ctrl.start_new_board()
 
+    def create_timed_board(self, minutes):
+        try:
+            seconds = float(minutes) * 60
+        except ValueError:
+            return 'Invalid number of minutes'
+        self._curr_board_id = self._ctrl.start_new_board(seconds=seconds)
+
+    def show_clock(self):
+        result = self._ctrl.clock_state(self._curr_board_id)
+        if isinstance(result['msg'], str):
+            return result['msg']
+        return ' | '.join(
+            f'{name}: {self.format_clock(left)}'
+            for name, left in result['msg'].items()
+        )
+
+    @staticmethod
+    def format_clock(left):
+        # Rounded before splitting, or 59.96 seconds would show as 0:60.0
+        minutes, seconds = divmod(round(max(left, 0), 1), 60)
+        return f'{int(minutes)}:{seconds:04.1f}'
+
+    def show_hint(self):
+        return self._ctrl.best_move(self._curr_board_id)['msg']
+
+    def show_moves(self):
+        result = self._ctrl.show_moves(self._curr_board_id)
+        if isinstance(result['msg'], str):
+            return result['msg']
+        return self.format_moves(result['msg']) or 'There are no moves yet'
+
+    def undo_move(self):
+        return self._ctrl.undo_move(self._curr_board_id)['msg']
+
+    def redo_move(self):
+        return self.format_result(
+            self._ctrl.redo_move(self._curr_board_id)['msg']
+        )
+
+    def format_result(self, message):
+        if not isinstance(message, dict):
+            return message
+        if message['winner'] is None:
+            result = f"Draw by {message['draw']}\n"
+        else:
+            result = f"{COLOR_NAMES[message['winner']]} player won\n"
+        return (
+            result +
+            f"Game history:\n{self.format_moves(message['history'])}"
+        )
+
+    def show_stats(self):
+        metrics = self._ctrl.metrics()
+        lines = [
+            f'{name}: {value}'
+            for name, value in metrics['gauges'].items()
+        ]
+        lines.extend(
+            f'{name}: {value}'
+            for name, value in metrics.get('counters', {}).items()
+        )
+        latency = metrics.get('latency', {})
+        if latency:
+            lines.append(
+                f"{'operation':<16}{'count':>8}"
+                f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            )
+        for name, summary in latency.items():
+            lines.append(
+                f"{name:<16}{summary['count']:>8}"
+                f"{summary['p50'] * 1000:>10.3f}"
+                f"{summary['p95'] * 1000:>10.3f}"
+                f"{summary['p99'] * 1000:>10.3f}"
+            )
+        return '\n'.join(lines)
+
+    @staticmethod
+    def format_moves(history):
+        return '\n'.join(
+            f"{i:02}| {Validator.pos_to_cellname(from_pos)} -> "
+            f"{Validator.pos_to_cellname(target_pos)}"
+            for i, (from_pos, target_pos) in enumerate(history, start=1)
+        )
+
     def show_all_boards(self):
         return ' | '.join(str(id) for id in self._ctrl.all_boards())
 
@@ -65,63 +163,31 @@ class PromptCLI:
             return func, board_id
 
     def _get_command(self):
-        print("To see all commands enter 'help'")
         command = input('Enter your move/command: ').lower()
-        self.clear()
 
         parts = command.strip().split()
         parsed = self.__command_parser(parts)
-        if parsed is None:
-            result = self._ctrl.make_move(self._curr_board_id, *parts)
-        else:
-            func, *args = parsed
-            parsed_msg = func(*args)
-        self.show_board()
         if parsed is not None:
-            if parsed_msg is not None:
-                print(parsed_msg)
+            func, *args = parsed
+            message = func(*args)
+            self.show_board(*([] if message is None else [str(message)]))
+            return
+
+        result = self._ctrl.make_move(self._curr_board_id, *parts)
+        self.show_board(self.format_result(result['msg']))
+
+    def show_board(self, *lines):
+        lines = [*lines, self.FOOTER]
+        result = self._ctrl.show_board(self._curr_board_id)
+        if isinstance(result['msg'], str):
+            lines = [result['msg'], '\nStart new board', *lines]
+            self._renderer.draw(None, lines)
             return
-        
-        message = result['msg']
-        if isinstance(message, str):
-            print(message)
-        elif isinstance(message, dict):
-            print(f"{COLOR_NAMES[message['winner']]} player won")
-            print("Game history:")
-            for i, move in enumerate(message['history'], start=1):
-                from_pos, target_pos = move
-                from_cell = Validator.pos_to_cellname(from_pos)
-                target_cell = Validator.pos_to_cellname(target_pos)
-                print(f"{i:02}| {from_cell} -> {target_cell}")
-
-    def show_board(self, board=None):
-        if board is None:
-            result = self._ctrl.show_board(self._curr_board_id)
-            if isinstance(result['msg'], str):
-                print(result['msg'])
-                print('\nStart new board')
-                return
-            board = result['msg']
-        mid_line = '-' * 34
-        view = f'\n{mid_line}\n'
-        for i, row in enumerate(board):
-            view = f"{view}{8 - i}| "
-            for figure in row:
-                if figure is None:
-                    symbol = ' '
-                else:
-                    symbol = TEXT_FIGURES[figure.color][figure.__class__]
-                view = f"{view}{symbol} | "
-            view = f"{view}\n{mid_line}\n"
-        view = f"{view}   {' * '.join('ABCDEFGH')}\n"
-        print(view)
-        return view
+        self._renderer.draw(result['msg'], lines)
 
     def clear(self):
-        if os.name == 'posix':
-            os.system("clear")
-        else:
-            os.system("cls")
+        self._renderer.reset()
+        self._renderer.draw(None)
 
     def show_help(self):
         return self.HINT
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from .archive import pack_moves, unpack_moves
+from .clock import GameClock
+
+
+MISSING = object()
+
+
+class DiskStore:
+
+    # Spill area for boards evicted from memory and archive index entries.
+    # The journal keeps the moves durable, so writes are not synced.
+    def __init__(self, path=None):
+        self.__directory = None
+        if path is None:
+            self.__directory = tempfile.TemporaryDirectory()
+            path = os.path.join(self.__directory.name, 'store.db')
+        self.path = path
+        self.__db = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False,
+        )
+        self.__db.execute('PRAGMA synchronous = OFF')
+        self.__db.execute('PRAGMA journal_mode = MEMORY')
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS boards '
+            '(id BLOB PRIMARY KEY, moves BLOB NOT NULL, clock BLOB)'
+        )
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS games '
+            '(id BLOB PRIMARY KEY, offset INTEGER NOT NULL)'
+        )
+
+    def put_board(self, board_id, moves, clock=None):
+        clock = None if clock is None else clock.pack()
+        self.__db.execute(
+            'INSERT OR REPLACE INTO boards VALUES (?, ?, ?)',
+            (board_id.bytes, pack_moves(moves), clock),
+        )
+
+    def board_moves(self, board_id):
+        # Moves and clock of a stored board, or None
+        row = self.__db.execute(
+            'SELECT moves, clock FROM boards WHERE id = ?', (board_id.bytes,),
+        ).fetchone()
+        if row is None:
+            return None
+        moves, clock = row
+        clock = None if clock is None else GameClock.unpack(clock)
+        return unpack_moves(moves), clock
+
+    def delete_board(self, board_id):
+        self.__db.execute('DELETE FROM boards WHERE id = ?', (board_id.bytes,))
+
+    def has_board(self, board_id):
+        return self.__db.execute(
+            'SELECT 1 FROM boards WHERE id = ?', (board_id.bytes,),
+        ).fetchone() is not None
+
+    def board_ids(self):
+        for (board_id,) in self.__db.execute('SELECT id FROM boards'):
+            yield UUID(bytes=board_id)
+
+    def boards(self):
+        rows = self.__db.execute('SELECT id, moves, clock FROM boards')
+        for board_id, moves, clock in rows:
+            clock = None if clock is None else GameClock.unpack(clock)
+            yield UUID(bytes=board_id), unpack_moves(moves), clock
+
+    def clear_boards(self):
+        self.__db.execute('DELETE FROM boards')
+
+    def board_count(self):
+        return self.__db.execute('SELECT COUNT(*) FROM boards').fetchone()[0]
+
+    def put_games(self, entries):
+        self.__db.executemany(
+            'INSERT OR REPLACE INTO games VALUES (?, ?)',
+            ((board_id.bytes, offset) for board_id, offset in entries),
+        )
+
+    def game_offset(self, board_id):
+        row = self.__db.execute(
+            'SELECT offset FROM games WHERE id = ?', (board_id.bytes,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def game_count(self):
+        return self.__db.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def close(self):
+        self.__db.close()
+        if self.__directory is not None:
+            self.__directory.cleanup()
+
+
+class BoardRegistry:
+
+    def __init__(self, loader, store=None, capacity=None, idle_seconds=None,
+                 clock=time.monotonic):
+        # `loader(board_id, moves)` rebuilds an evicted board
+        self.loader = loader
+        self.store = store
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        # Least recently used first, with the time of the last access
+        self.__boards = OrderedDict()
+        self.__stored = store.board_count() if store is not None else 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __touch(self, board_id, board):
+        self.__boards[board_id] = (board, self.clock())
+        self.__boards.move_to_end(board_id)
+
+    def __evict_over(self):
+        if self.store is None:
+            return
+        boards = self.__boards
+        if self.idle_seconds is not None:
+            deadline = self.clock() - self.idle_seconds
+            while boards and next(iter(boards.values()))[1] < deadline:
+                self.__evict(next(iter(boards)))
+        if self.capacity is not None:
+            while len(boards) > self.capacity:
+                self.__evict(next(iter(boards)))
+
+    def __evict(self, board_id):
+        board, _ = self.__boards.pop(board_id)
+        self.store.put_board(board_id, board.move_list(), board.clock)
+        self.__stored += 1
+        self.evictions += 1
+
+    def __reload(self, board_id):
+        if self.store is None or not self.__stored:
+            return None
+        stored = self.store.board_moves(board_id)
+        if stored is None:
+            return None
+        self.store.delete_board(board_id)
+        self.__stored -= 1
+        self.reloads += 1
+        return self.__load(board_id, *stored)
+
+    def __load(self, board_id, moves, clock=None):
+        board = self.loader(board_id, moves)
+        board.clock = clock
+        return board
+
+    def evict_idle(self):
+        self.__evict_over()
+
+    def get(self, board_id, default=None):
+        entry = self.__boards.get(board_id)
+        if entry is not None:
+            board = entry[0]
+        elif (board := self.__reload(board_id)) is None:
+            return default
+        self.__touch(board_id, board)
+        self.__evict_over()
+        return board
+
+    def __getitem__(self, board_id):
+        board = self.get(board_id)
+        if board is None:
+            raise KeyError(board_id)
+        return board
+
+    def __setitem__(self, board_id, board):
+        self.__touch(board_id, board)
+        self.__evict_over()
+
+    def pop(self, board_id, default=MISSING):
+        entry = self.__boards.pop(board_id, None)
+        if entry is not None:
+            return entry[0]
+        board = self.__reload(board_id)
+        if board is None:
+            if default is MISSING:
+                raise KeyError(board_id)
+            return default
+        return board
+
+    def peek(self, board_id):
+        # A board without counting it as used or reloading it into memory
+        entry = self.__boards.get(board_id)
+        if entry is not None:
+            return entry[0]
+        stored = self.store.board_moves(board_id) if self.__stored else None
+        return None if stored is None else self.__load(board_id, *stored)
+
+    def update(self, boards):
+        for board_id, board in boards.items():
+            self[board_id] = board
+
+    def __contains__(self, board_id):
+        if board_id in self.__boards:
+            return True
+        return bool(self.__stored) and self.store.has_board(board_id)
+
+    def __iter__(self):
+        yield from list(self.__boards)
+        if self.__stored:
+            yield from self.store.board_ids()
+
+    def keys(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.__boards) + self.__stored
+
+    def items(self):
+        # Stored boards are rebuilt without reloading them into memory
+        for board_id, (board, _) in list(self.__boards.items()):
+            yield board_id, board
+        if self.__stored:
+            for board_id, moves, clock in self.store.boards():
+                yield board_id, self.__load(board_id, moves, clock)
+
+    def values(self):
+        for _, board in self.items():
+            yield board
+
+    def resident(self):
+        return {board_id: board for board_id, (board, _) in
+                self.__boards.items()}
+
+    def move_lists(self):
+        result = [
+            (board_id, board.move_list())
+            for board_id, (board, _) in self.__boards.items()
+        ]
+        if self.__stored:
+            result.extend(
+                (board_id, moves) for board_id, moves, _ in self.store.boards()
+            )
+        return result
+
+    def stats(self):
+        return {
+            'resident': len(self.__boards),
+            'stored': self.__stored,
+            'evictions': self.evictions,
+            'reloads': self.reloads,
+        }
@@ -0,0 +1,77 @@
+import shutil
+import sys
+
+from .figure import TEXT_FIGURES
+
+
+CLEAR = '\x1b[H\x1b[2J'
+ERASE_BELOW = '\x1b[J'
+RULE = '-' * 34
+
+
+def move_to(line, column):
+    return f'\x1b[{line};{column}H'
+
+
+def symbol_of(figure):
+    if figure is None:
+        return ' '
+    return TEXT_FIGURES[figure.color][figure.__class__]
+
+
+class TerminalRenderer:
+
+    # Screen line of the 8th rank and column of the A file, 1-based
+    TOP = 3
+    LEFT = 4
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.frame = self.static_frame()
+        self.footer = self.frame.count('\n') + 2
+        # Symbols currently on the screen, None when it has to be redrawn
+        self.__cells = None
+
+    @staticmethod
+    def static_frame():
+        lines = ['', RULE]
+        for i in range(8):
+            lines.append(f"{8 - i}| " + '  | ' * 8)
+            lines.append(RULE)
+        lines.append(f"   {' * '.join('ABCDEFGH')}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        self.__cells = None
+
+    def draw(self, board, lines=()):
+        output = []
+        if board is None:
+            self.__cells = None
+            output.append(CLEAR)
+        else:
+            cells = [symbol_of(figure) for row in board for figure in row]
+            previous = self.__cells
+            if previous is None:
+                output.append(CLEAR)
+                output.append(self.frame)
+                previous = [' '] * 64
+            for square, symbol in enumerate(cells):
+                if symbol != previous[square]:
+                    output.append(move_to(
+                        self.TOP + square // 8 * 2,
+                        self.LEFT + square % 8 * 4,
+                    ))
+                    output.append(symbol)
+            output.append(move_to(self.footer, 1) + ERASE_BELOW)
+            self.__cells = cells
+            # Output taller than the terminal, with the prompt below it,
+            # scrolls the board away
+            used = self.footer + 1 + sum(
+                line.count('\n') + 1 for line in lines
+            )
+            if used > shutil.get_terminal_size().lines:
+                self.__cells = None
+        output.extend(f'{line}\n' for line in lines)
+        self.stream.write(''.join(output))
+        self.stream.flush()
@@ -0,0 +1,293 @@
+import time
+
+from .bitboard import KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN
+from .movegen import legal_moves
+from .utils import Colors
+
+
+INFINITY = 10 ** 6
+MATE = 10 ** 5
+# Scores beyond this are mates, MATE less the plies to the mate
+MATE_BOUND = MATE - 1000
+# Longest search a caller can ask for, in seconds
+MAX_SECONDS = 10.0
+
+PIECE_VALUES = {
+    KING: 0, QUEEN: 900, ROOK: 500, BISHOP: 330, KNIGHT: 320, PAWN: 100,
+}
+
+# Piece-square tables from White's side, first row is the 8th rank
+PIECE_SQUARES = {
+    PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    ROOK: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    QUEEN: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    KING: (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+# SCORES[color][kind][square] folds material into the square bonus
+SCORES = tuple(
+    tuple(
+        tuple(
+            PIECE_VALUES[kind] + PIECE_SQUARES[kind][
+                square if color == Colors.WHITE else square ^ 56
+            ]
+            for square in range(64)
+        )
+        for kind in range(6)
+    )
+    for color in (Colors.WHITE, Colors.BLACK)
+)
+
+EXACT, LOWER, UPPER = range(3)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(position):
+    score = 0
+    for square, figure in enumerate(position.squares):
+        if figure is not None:
+            value = SCORES[figure.color][figure.kind][square]
+            score += value if figure.color == Colors.WHITE else -value
+    return score if position.turn == Colors.WHITE else -score
+
+
+def to_table(score, ply):
+    # Mates are stored as plies from the entry's node, not from the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+
+    # The clock is read every CHECK_EVERY nodes, the node limit on each node
+    CHECK_EVERY = 16
+
+    def __init__(self, table_size=1 << 18):
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+        # Best root move of the running iteration and its score
+        self._root_best = None
+
+    def search(self, position, seconds=1.0, max_nodes=None, max_depth=64):
+        if not seconds > 0:
+            raise ValueError('The search needs a positive time budget')
+        position = position.copy()
+        self.nodes = 0
+        self._deadline = time.perf_counter() + min(seconds, MAX_SECONDS)
+        self._max_nodes = max_nodes
+        if len(self.table) > self.table_size:
+            self.table.clear()
+
+        best = None
+        result = {'move': None, 'score': 0, 'depth': 0}
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._root(position, depth, best)
+            except SearchTimeout:
+                # The previous best is searched first, so a move that
+                # replaced it already scored better at this depth
+                if self._root_best is not None:
+                    score, move = self._root_best
+                    result = {'move': move, 'score': score, 'depth': depth}
+                break
+            if move is None:
+                break
+            best = move
+            result = {'move': move, 'score': score, 'depth': depth}
+            if abs(score) >= MATE - max_depth:
+                break
+        if result['move'] is None:
+            # Stopped before any root move was searched
+            result['move'] = next(iter(self._ordered(position, None)), None)
+        result['nodes'] = self.nodes
+        return result
+
+    def _root(self, position, depth, best):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = None
+        self._root_best = None
+        for start, target in self._ordered(position, best):
+            undo = position.make_move(start, target)
+            try:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            finally:
+                position.unmake_move(undo)
+            if best_move is None or score > alpha:
+                alpha = score
+                best_move = (start, target)
+                self._root_best = (alpha, best_move)
+        return alpha, best_move
+
+    def _tick(self):
+        if self._max_nodes and self.nodes >= self._max_nodes:
+            raise SearchTimeout
+        self.nodes += 1
+        if self.nodes % self.CHECK_EVERY:
+            return
+        if time.perf_counter() >= self._deadline:
+            raise SearchTimeout
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self._tick()
+        original_alpha = alpha
+        entry = self.table.get(position.key)
+        hash_move = None
+        if entry is not None:
+            entry_depth, entry_score, flag, hash_move = entry
+            entry_score = from_table(entry_score, ply)
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER and entry_score <= alpha:
+                    return entry_score
+
+        if depth <= 0:
+            return self._quiescence(position, alpha, beta)
+
+        best_score = -INFINITY
+        best_move = None
+        for start, target in self._ordered(position, hash_move):
+            undo = position.make_move(start, target)
+            try:
+                score = -self._negamax(
+                    position, depth - 1, -beta, -alpha, ply + 1,
+                )
+            finally:
+                position.unmake_move(undo)
+            if score > best_score:
+                best_score = score
+                best_move = (start, target)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_move is None:
+            if position.in_check(position.turn):
+                return -MATE + ply
+            return 0
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[position.key] = (
+            depth, to_table(best_score, ply), flag, best_move,
+        )
+        return best_score
+
+    def _quiescence(self, position, alpha, beta):
+        self._tick()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        for start, target in self._ordered(position, None, captures=True):
+            undo = position.make_move(start, target)
+            try:
+                score = -self._quiescence(position, -beta, -alpha)
+            finally:
+                position.unmake_move(undo)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    @staticmethod
+    def _ordered(position, hash_move, captures=False):
+        squares = position.squares
+        scored = []
+        for move in legal_moves(position, position.turn):
+            start, target = move
+            victim = squares[target]
+            if victim is None:
+                if captures:
+                    continue
+                order = 0
+            else:
+                order = (PIECE_VALUES[victim.kind] * 10 -
+                         PIECE_VALUES[squares[start].kind] // 10 + 1)
+            if move == hash_move:
+                order = INFINITY
+            scored.append((order, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from uuid import UUID
+
+from .board import Board
+from .controller import Controller
+from .sharded import ShardedController
+from .utils import COLOR_NAMES, Colors, Validator
+
+
+OPERATIONS = {
+    'new-board': 'start_new_board',
+    'boards': 'all_boards',
+    'move': 'make_move',
+    'moves': 'make_moves',
+    'show': 'show_board',
+    'end': 'end_board',
+    'stat': 'game_stat',
+    'best': 'best_move',
+    'undo': 'undo_move',
+    'redo': 'redo_move',
+    'history': 'show_moves',
+    'metrics': 'metrics',
+    'prometheus': 'prometheus',
+    'clock': 'clock_state',
+}
+
+
+def to_json(value):
+    if isinstance(value, dict):
+        return {key: to_json_field(key, item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if is_matrix(value):
+            return [render_row(row) for row in value]
+        return [to_json(item) for item in value]
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Board):
+        return str(value.id)
+    return value
+
+
+def to_json_field(key, value):
+    if key == 'winner':
+        return None if value is None else COLOR_NAMES[value]
+    if key == 'history' and isinstance(value, list):
+        return [
+            [Validator.pos_to_cellname(start),
+             Validator.pos_to_cellname(target)]
+            for start, target in value
+        ]
+    return to_json(value)
+
+
+def is_matrix(value):
+    return len(value) == 8 and all(
+        isinstance(row, list) and len(row) == 8 for row in value
+    )
+
+
+def render_row(row):
+    cells = []
+    for figure in row:
+        if figure is None:
+            cells.append('.')
+        elif figure.color == Colors.WHITE:
+            cells.append(figure.notation)
+        else:
+            cells.append(figure.notation.lower())
+    return ''.join(cells)
+
+
+class Server:
+
+    def __init__(self, controller, host='127.0.0.1', port=8765, workers=1,
+                 tick_seconds=0.1):
+        self.controller = controller
+        self.host = host
+        self.port = port
+        # How often one task checks every game clock for flag-fall
+        self.tick_seconds = tick_seconds
+        self.ticker = None
+        # A plain Controller is not thread-safe, so it gets one worker
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Searches run here, so a hint does not hold up the other boards
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle, self.host, self.port,
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.tick_seconds:
+            self.ticker = asyncio.create_task(self.tick_forever())
+        return self.server
+
+    async def tick_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            await loop.run_in_executor(self.executor, self.controller.tick)
+            await loop.run_in_executor(
+                self.executor, self.controller.evict_idle,
+            )
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.ticker is not None:
+            self.ticker.cancel()
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=False)
+        self.search_executor.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                response = await self.dispatch(loop, line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, loop, line):
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = OPERATIONS[request['op']]
+            args = request.get('args', [])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {'id': None, 'error': 'Invalid request'}
+        try:
+            if method == 'best_move' and hasattr(self.controller,
+                                                 'search_job'):
+                result = await self.search(loop, args)
+            else:
+                result = await loop.run_in_executor(
+                    self.executor, self.call, method, args,
+                )
+        except Exception as error:
+            return {'id': request_id, 'error': str(error)}
+        return {'id': request_id, 'result': result}
+
+    async def search(self, loop, args):
+        job = await loop.run_in_executor(
+            self.executor, self.call, 'search_job', args,
+        )
+        if not callable(job):
+            return job
+        started = perf_counter()
+        result = await loop.run_in_executor(self.search_executor, job)
+        # Recorded on the board executor, which owns the telemetry
+        await loop.run_in_executor(
+            self.executor, self.call, 'observe',
+            ['best_move', perf_counter() - started],
+        )
+        return to_json(result)
+
+    def call(self, method, args):
+        return to_json(getattr(self.controller, method)(*args))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.server',
+        description='Serve Controller operations as JSON lines over TCP',
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Host boards in this many worker processes')
+    args = parser.parse_args(argv)
+
+    if args.shards:
+        controller = ShardedController(workers=args.shards)
+        workers = args.shards
+    else:
+        controller = Controller()
+        workers = 1
+    server = Server(controller, args.host, args.port, workers)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if args.shards:
+            controller.close()
+
+
+if __name__ == '__main__':
+    main()
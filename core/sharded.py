@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+from functools import partial
+from threading import Lock
+from time import perf_counter
+from uuid import uuid4
+
+from .controller import Controller, search_hint
+from .metrics import Metrics, to_prometheus
+from .search import Searcher
+
+
+def _serve(connection, options):
+    controller = Controller(**options)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            connection.send((True, getattr(controller, method)(*args)))
+        except Exception as error:
+            connection.send((False, error))
+    controller.close()
+    connection.close()
+
+
+def shard_path(path, index):
+    root, extension = os.path.splitext(path)
+    return f'{root}-shard-{index}{extension}'
+
+
+def shard_options(options, index):
+    # Every shard process writes its own files
+    options = dict(options)
+    for name in ('archive_path', 'store_path'):
+        if options.get(name) is not None:
+            options[name] = shard_path(options[name], index)
+    if options.get('journal_dir') is not None:
+        options['journal_dir'] = os.path.join(
+            options['journal_dir'], f'shard-{index}',
+        )
+    return options
+
+
+class _Shard:
+
+    def __init__(self, context, options):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child, options), daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.lock = Lock()
+
+    def send(self, method, *args):
+        self.connection.send((method, args))
+
+    def receive(self):
+        ok, result = self.connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def call(self, method, *args):
+        with self.lock:
+            self.send(method, *args)
+            return self.receive()
+
+    def close(self):
+        with self.lock:
+            self.connection.send(None)
+            self.connection.close()
+        self.process.join()
+
+
+class ShardedController:
+
+    def __init__(self, workers=None, **options):
+        workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context()
+        self._shards = [
+            _Shard(context, shard_options(options, i)) for i in range(workers)
+        ]
+        # Hints are searched in this process, the shards only copy positions
+        self.searcher = Searcher()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for shard in self._shards:
+            shard.close()
+        self._shards = []
+
+    def _shard(self, board_id):
+        return self._shards[board_id.int % len(self._shards)]
+
+    def _route(self, method, board_id, *args):
+        board_id = Controller.convert_id(board_id)
+        if not board_id:
+            return {'msg': 'Invalid board id'}
+        return self._shard(board_id).call(method, board_id, *args)
+
+    def make_move(self, board_id, from_cell, target_cell):
+        return self._route('make_move', board_id, from_cell, target_cell)
+
+    def make_moves(self, batch):
+        results = [None] * len(batch)
+        by_shard = {}
+        for i, (board_id, from_cell, target_cell) in enumerate(batch):
+            converted = Controller.convert_id(board_id)
+            if not converted:
+                results[i] = 'Invalid board id'
+                continue
+            indexes, moves = by_shard.setdefault(
+                self._shard(converted), ([], [])
+            )
+            indexes.append(i)
+            moves.append((converted, from_cell, target_cell))
+
+        replies = self._scatter('make_moves', {
+            shard: (moves,) for shard, (_, moves) in by_shard.items()
+        })
+        for shard, reply in replies.items():
+            for i, result in zip(by_shard[shard][0], reply):
+                results[i] = result
+        return results
+
+    def _scatter(self, method, args_by_shard):
+        # Sends to every shard first so the workers run in parallel. The
+        # locks are always taken in shard order, or two batches touching
+        # the same shards in opposite order would wait on each other.
+        shards = sorted(args_by_shard, key=self._shards.index)
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            for shard in shards:
+                shard.send(method, *args_by_shard[shard])
+            return {shard: shard.receive() for shard in shards}
+        finally:
+            for shard in shards:
+                shard.lock.release()
+
+    def undo_move(self, board_id):
+        return self._route('undo_move', board_id)
+
+    def redo_move(self, board_id):
+        return self._route('redo_move', board_id)
+
+    def best_move(self, board_id, budget=1.0, nodes=None):
+        job = self.search_job(board_id, budget, nodes)
+        if isinstance(job, dict):
+            return job
+        started = perf_counter()
+        result = job()
+        self.observe('best_move', perf_counter() - started)
+        return result
+
+    def search_job(self, board_id, budget=1.0, nodes=None):
+        request = self._route('search_request', board_id, budget, nodes)
+        if isinstance(request, dict):
+            return request
+        return partial(search_hint, self.searcher, *request)
+
+    def game_stat(self, board_id):
+        board_id = Controller.convert_id(board_id)
+        if not board_id:
+            return 'Incorrect board id'
+        return self._shard(board_id).call('game_stat', board_id)
+
+    def start_new_board(self, seconds=None, increment=0):
+        new_id = uuid4()
+        return self._shard(new_id).call(
+            '_start_board', new_id, seconds, increment,
+        )
+
+    def tick(self):
+        replies = self._scatter('tick', {shard: () for shard in self._shards})
+        return [board_id for ended in replies.values() for board_id in ended]
+
+    def evict_idle(self):
+        self._scatter('evict_idle', {shard: () for shard in self._shards})
+
+    def clock_state(self, board_id):
+        return self._route('clock_state', board_id)
+
+    def end_board(self, board_id):
+        return self._route('end_board', board_id)
+
+    def all_boards(self):
+        result = []
+        for shard in self._shards:
+            result.extend(shard.call('all_boards'))
+        return result
+
+    def show_board(self, board_id):
+        return self._route('show_board', board_id)
+
+    def show_moves(self, board_id, first=0, last=None):
+        return self._route('show_moves', board_id, first, last)
+
+    def dump_profiles(self, directory):
+        paths = []
+        for i, shard in enumerate(self._shards):
+            shard_directory = os.path.join(directory, f'shard-{i}')
+            paths.extend(shard.call('dump_profiles', shard_directory))
+        return paths
+
+    def observe(self, name, seconds):
+        # Shard metrics are merged, so any shard can keep the latency
+        self._shards[0].call('observe', name, seconds)
+
+    def metrics_state(self):
+        merged = None
+        gauges = {}
+        for shard in self._shards:
+            telemetry, shard_gauges = shard.call('metrics_state')
+            if telemetry is not None:
+                if merged is None:
+                    merged = Metrics()
+                merged.merge(telemetry)
+            for name, value in shard_gauges.items():
+                gauges[name] = gauges.get(name, 0) + value
+        return merged, gauges
+
+    def metrics(self):
+        telemetry, gauges = self.metrics_state()
+        if telemetry is None:
+            return {'gauges': gauges}
+        return telemetry.snapshot(gauges)
+
+    def prometheus(self):
+        return to_prometheus(*self.metrics_state())
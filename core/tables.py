@@ -0,0 +1,211 @@
+from random import Random
+
+from .utils import Colors
+
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KING_STEPS = DIRECTIONS
+KNIGHT_STEPS = (
+    (-2, -1), (-2, 1), (-1, -2), (-1, 2),
+    (1, -2), (1, 2), (2, -1), (2, 1),
+)
+
+# Indexes into DIRECTIONS
+ROOK_RAYS = (0, 1, 2, 3)
+BISHOP_RAYS = (4, 5, 6, 7)
+# Directions in which square indexes grow, so the nearest blocker
+# on a ray is its lowest set bit instead of the highest one
+POSITIVE_RAYS = frozenset(
+    i for i, (row_step, column_step) in enumerate(DIRECTIONS)
+    if row_step * 8 + column_step > 0
+)
+
+
+def _walk(square, row_step, column_step, limit=8):
+    row, column = divmod(square, 8)
+    for _ in range(limit):
+        row += row_step
+        column += column_step
+        if not (0 <= row < 8 and 0 <= column < 8):
+            return
+        yield row, column
+
+
+def _steps(square, steps):
+    return tuple(
+        pos for row_step, column_step in steps
+        for pos in _walk(square, row_step, column_step, limit=1)
+    )
+
+
+def _mask(positions):
+    result = 0
+    for row, column in positions:
+        result |= 1 << (row * 8 + column)
+    return result
+
+
+def _pawn_moves(square, color):
+    row, column = divmod(square, 8)
+    row_step = -1 if color == Colors.WHITE else 1
+    start_row = 6 if color == Colors.WHITE else 1
+    steps = [(row_step, -1), (row_step, 0), (row_step, 1)]
+    if row == start_row:
+        steps.append((2 * row_step, 0))
+    return _steps(square, steps)
+
+
+def _pawn_captures(square, color):
+    row_step = -1 if color == Colors.WHITE else 1
+    return _steps(square, ((row_step, -1), (row_step, 1)))
+
+
+SQUARES = range(64)
+
+KNIGHT_MOVES = tuple(_steps(sq, KNIGHT_STEPS) for sq in SQUARES)
+KING_MOVES = tuple(_steps(sq, KING_STEPS) for sq in SQUARES)
+PAWN_MOVES = tuple(
+    tuple(_pawn_moves(sq, color) for sq in SQUARES)
+    for color in (Colors.WHITE, Colors.BLACK)
+)
+
+# Squares of the same color as A8
+LIGHT_SQUARES = _mask(
+    divmod(sq, 8) for sq in SQUARES if sum(divmod(sq, 8)) % 2 == 0
+)
+
+KNIGHT_ATTACKS = tuple(_mask(moves) for moves in KNIGHT_MOVES)
+KING_ATTACKS = tuple(_mask(moves) for moves in KING_MOVES)
+PAWN_ATTACKS = tuple(
+    tuple(_mask(_pawn_captures(sq, color)) for sq in SQUARES)
+    for color in (Colors.WHITE, Colors.BLACK)
+)
+
+# RAY_SQUARES[direction][square] lists the cells from `square` to the edge
+RAY_SQUARES = tuple(
+    tuple(tuple(_walk(sq, *direction)) for sq in SQUARES)
+    for direction in DIRECTIONS
+)
+RAYS = tuple(
+    tuple(_mask(cells) for cells in ray)
+    for ray in RAY_SQUARES
+)
+
+ROOK_MOVES = tuple(
+    sum((RAY_SQUARES[d][sq] for d in ROOK_RAYS), ()) for sq in SQUARES
+)
+BISHOP_MOVES = tuple(
+    sum((RAY_SQUARES[d][sq] for d in BISHOP_RAYS), ()) for sq in SQUARES
+)
+QUEEN_MOVES = tuple(
+    ROOK_MOVES[sq] + BISHOP_MOVES[sq] for sq in SQUARES
+)
+# Every square on a line with `square`, whatever stands between
+ROOK_LINES = tuple(_mask(moves) for moves in ROOK_MOVES)
+BISHOP_LINES = tuple(_mask(moves) for moves in BISHOP_MOVES)
+
+
+def _between(square):
+    result = [0] * 64
+    for ray in RAY_SQUARES:
+        mask = 0
+        for row, column in ray[square]:
+            target = row * 8 + column
+            result[target] = mask
+            mask |= 1 << target
+    return tuple(result)
+
+
+# BETWEEN[a][b] holds the cells strictly between two aligned squares
+BETWEEN = tuple(_between(sq) for sq in SQUARES)
+
+# Castling rights are a bitmask of these
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+CASTLING_RIGHTS = (WHITE_KINGSIDE | WHITE_QUEENSIDE,
+                   BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+
+def _castling(right, king, target, rook, rook_target):
+    # The squares between king and rook must be empty and the ones the
+    # king stands on or crosses must not be attacked
+    path = 1 << king | 1 << (king + target) // 2 | 1 << target
+    return right, king, target, rook, rook_target, BETWEEN[king][rook], path
+
+
+# Right, king from, king to, rook from, rook to, empty and safe squares
+CASTLINGS = (
+    (_castling(WHITE_KINGSIDE, 60, 62, 63, 61),
+     _castling(WHITE_QUEENSIDE, 60, 58, 56, 59)),
+    (_castling(BLACK_KINGSIDE, 4, 6, 7, 5),
+     _castling(BLACK_QUEENSIDE, 4, 2, 0, 3)),
+)
+# Rook from and to squares by the target of the castling king
+CASTLING_ROOKS = {
+    target: (rook, rook_target)
+    for castlings in CASTLINGS
+    for _, _, target, rook, rook_target, _, _ in castlings
+}
+
+
+def _castling_mask():
+    result = [ALL_CASTLING] * 64
+    for castlings in CASTLINGS:
+        for right, king, _, rook, _, _, _ in castlings:
+            result[king] &= ~right
+            result[rook] &= ~right
+    return tuple(result)
+
+
+# Rights kept when a piece leaves or lands on a square, so moving a king
+# or rook, or capturing a rook, drops them with one AND
+CASTLING_MASK = _castling_mask()
+
+
+def ray_attacks(square, occupied, directions):
+    result = 0
+    for direction in directions:
+        rays = RAYS[direction]
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            if direction in POSITIVE_RAYS:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rays[blocker]
+        result |= ray
+    return result
+
+
+def rook_attacks(square, occupied):
+    return ray_attacks(square, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(square, occupied):
+    return ray_attacks(square, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(square, occupied):
+    return (ray_attacks(square, occupied, ROOK_RAYS) |
+            ray_attacks(square, occupied, BISHOP_RAYS))
+
+
+_random = Random(0x5EED)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# Zobrist keys; a position key is the XOR of the keys of its features
+ZOBRIST_PIECES = tuple(
+    tuple(tuple(_key() for sq in SQUARES) for kind in range(6))
+    for color in (Colors.WHITE, Colors.BLACK)
+)
+ZOBRIST_SIDE = _key()
+# No rights add nothing, so positions without castling keep their keys
+ZOBRIST_CASTLING = (0,) + tuple(_key() for rights in range(1, 16))
+ZOBRIST_EN_PASSANT = tuple(_key() for column in range(8))
@@ -0,0 +1,283 @@
+import argparse
+import json
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .bitboard import KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN, Position
+from .board import Board
+from .figure import Figure
+from .movegen import attacked_squares, legal_moves
+from .tables import KNIGHT_STEPS, KING_STEPS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from .utils import Colors
+
+
+# Plane of a piece is color * 6 + kind, squares are laid out like Position
+PLANES = 12
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError('Batched analysis needs numpy: pip install numpy')
+
+
+def to_tensor(positions):
+    # (N, 12, 8, 8) bool planes unpacked from the bitboards in one call
+    require_numpy()
+    bitboards = np.array(
+        [position.pieces[0] + position.pieces[1] for position in positions],
+        dtype='<u8',
+    ).reshape(-1, PLANES)
+    bits = np.unpackbits(
+        bitboards.view(np.uint8).reshape(-1, PLANES, 8), axis=-1,
+        bitorder='little',
+    )
+    return bits.reshape(-1, PLANES, 8, 8).astype(bool)
+
+
+def turns_of(positions):
+    require_numpy()
+    return np.array([position.turn for position in positions], dtype=np.int8)
+
+
+def to_positions(tensor, turns):
+    require_numpy()
+    classes = {cls.kind: cls for cls in Figure.__subclasses__()}
+    positions = []
+    for planes, turn in zip(np.asarray(tensor), turns):
+        squares = [None] * 64
+        for plane, square in zip(*np.nonzero(planes.reshape(PLANES, 64))):
+            color, kind = divmod(int(plane), 6)
+            squares[square] = classes[kind](color)
+        position = Position.from_squares(squares)
+        position.set_turn(int(turn))
+        positions.append(position)
+    return positions
+
+
+def to_boards(tensor, turns, ids=None, cache=None):
+    positions = to_positions(tensor, turns)
+    if ids is None:
+        ids = range(len(positions))
+    boards = []
+    for board_id, position in zip(ids, positions):
+        boards.append(Board.from_squares(
+            board_id, position.squares, position.turn, cache,
+        ))
+    return boards
+
+
+def from_boards(boards):
+    positions = [board.position for board in boards]
+    return to_tensor(positions), turns_of(positions)
+
+
+def from_controller(controller):
+    # Evicted boards are read without loading them back into the registry
+    ids = list(controller.boards)
+    tensor, turns = from_boards(controller.boards.peek(id) for id in ids)
+    return ids, tensor, turns
+
+
+def shift(planes, rows, columns):
+    # Moves every set square by (rows, columns), dropping the ones that
+    # leave the board
+    result = np.zeros_like(planes)
+    source = planes[
+        ..., max(0, -rows):8 - max(0, rows),
+        max(0, -columns):8 - max(0, columns),
+    ]
+    result[
+        ..., max(0, rows):8 - max(0, -rows),
+        max(0, columns):8 - max(0, -columns),
+    ] = source
+    return result
+
+
+def _count(planes):
+    return planes.sum(axis=(-2, -1))
+
+
+def _side(tensor, color, occupied):
+    # Attack map and pseudo-legal move count of one side, see plane_targets
+    planes = tensor[:, color * 6:color * 6 + 6]
+    own = planes.any(axis=1)
+    enemy = occupied & ~own
+    free = ~own
+    attacked = np.zeros_like(own)
+    mobility = np.zeros(len(tensor), dtype=np.int64)
+
+    for kind, steps in ((KNIGHT, KNIGHT_STEPS), (KING, KING_STEPS)):
+        for rows, columns in steps:
+            reached = shift(planes[:, kind], rows, columns)
+            attacked |= reached
+            mobility += _count(reached & free)
+
+    queens = planes[:, QUEEN]
+    for sliders, directions in (
+            (planes[:, ROOK] | queens, ROOK_DIRECTIONS),
+            (planes[:, BISHOP] | queens, BISHOP_DIRECTIONS)):
+        for rows, columns in directions:
+            ray = shift(sliders, rows, columns)
+            while ray.any():
+                attacked |= ray
+                mobility += _count(ray & free)
+                ray = shift(ray & ~occupied, rows, columns)
+
+    pawns = planes[:, PAWN]
+    forward = -1 if color == Colors.WHITE else 1
+    for columns in (-1, 1):
+        reached = shift(pawns, forward, columns)
+        attacked |= reached
+        mobility += _count(reached & enemy)
+    one_step = shift(pawns, forward, 0) & ~occupied
+    mobility += _count(one_step)
+    # Pawns that stepped off their start row may step once more
+    row = 5 if color == Colors.WHITE else 2
+    from_start = np.zeros_like(one_step)
+    from_start[:, row] = one_step[:, row]
+    mobility += _count(shift(from_start, forward, 0) & ~occupied)
+    return attacked, mobility
+
+
+def analyze(tensor):
+    require_numpy()
+    tensor = np.asarray(tensor, dtype=bool)
+    occupied = tensor.any(axis=1)
+    attacked = np.zeros((len(tensor), 2, 8, 8), dtype=bool)
+    mobility = np.zeros((len(tensor), 2), dtype=np.int64)
+    for color in (Colors.WHITE, Colors.BLACK):
+        attacked[:, color], mobility[:, color] = _side(tensor, color, occupied)
+    in_check = np.stack([
+        (tensor[:, color * 6 + KING] & attacked[:, 1 - color]).any(axis=(1, 2))
+        for color in (Colors.WHITE, Colors.BLACK)
+    ], axis=1)
+    return {'attacked': attacked, 'in_check': in_check, 'mobility': mobility}
+
+
+def find_mates(positions):
+    # Only the positions whose side to move is in check are searched for
+    # a legal move
+    positions = list(positions)
+    turns = turns_of(positions)
+    in_check = analyze(to_tensor(positions))['in_check']
+    checked = np.nonzero(in_check[np.arange(len(positions)), turns])[0]
+    return [
+        int(i) for i in checked
+        if next(legal_moves(positions[i], positions[i].turn), None) is None
+    ]
+
+
+def plane_targets(figure, square, position):
+    # Targets without castling and en passant, which the planes cannot
+    # describe
+    if figure.kind == KING:
+        return Figure.targets(figure, square, position)
+    targets = figure.targets(square, position)
+    if figure.kind == PAWN and position.en_passant is not None:
+        targets &= ~(1 << position.en_passant)
+    return targets
+
+
+def analyze_each(positions):
+    # The per-position loop the batch replaces, used by the benchmark
+    result = []
+    for position in positions:
+        row = []
+        for color in (Colors.WHITE, Colors.BLACK):
+            mobility = 0
+            for square, figure in position.figures(color):
+                targets = plane_targets(figure, square, position)
+                mobility += bin(targets).count('1')
+            row.append((
+                attacked_squares(position, color, position.all),
+                position.in_check(color),
+                mobility,
+            ))
+        result.append(row)
+    return result
+
+
+def same_analysis(loop, batch):
+    attacked = np.packbits(
+        batch['attacked'].reshape(-1, 2, 64), axis=-1, bitorder='little',
+    ).view('<u8')[..., 0]
+    return all(
+        (int(attacked[i, color]), bool(batch['in_check'][i, color]),
+         int(batch['mobility'][i, color])) == row[color]
+        for i, row in enumerate(loop)
+        for color in (Colors.WHITE, Colors.BLACK)
+    )
+
+
+def random_positions(count, max_plies=80, seed=0):
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        board = Board(None)
+        for _ in range(rng.randint(0, max_plies)):
+            moves = list(board.legal_moves())
+            if not moves or board.is_over:
+                break
+            board.make_move(*rng.choice(moves))
+        positions.append(board.position)
+    return positions
+
+
+def benchmark(count=2000, seed=0):
+    require_numpy()
+    positions = random_positions(count, seed=seed)
+    report = {'positions': count}
+
+    started = time.perf_counter()
+    loop = analyze_each(positions)
+    report['loop_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = analyze(to_tensor(positions))
+    report['batch_seconds'] = time.perf_counter() - started
+
+    if not same_analysis(loop, batch):
+        raise AssertionError('Batched analysis disagrees with the loop')
+
+    started = time.perf_counter()
+    loop_mates = [
+        i for i, position in enumerate(positions)
+        if Figure.check_for_mate(position.turn, position) is not None
+    ]
+    report['mate_loop_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch_mates = find_mates(positions)
+    report['mate_batch_seconds'] = time.perf_counter() - started
+
+    if loop_mates != batch_mates:
+        raise AssertionError('Batched mate detection disagrees with the loop')
+    report['mates'] = len(batch_mates)
+    report['speedup'] = report['loop_seconds'] / report['batch_seconds']
+    report['mate_speedup'] = (
+        report['mate_loop_seconds'] / report['mate_batch_seconds']
+    )
+    return {
+        key: round(value, 6) if isinstance(value, float) else value
+        for key, value in report.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.tensor',
+        description='Compare batched NumPy analysis with the per-board loop',
+    )
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.positions, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
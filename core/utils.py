@@ -94,9 +94,24 @@ class Validator:
 
         return f"{column}{row}"
 
+    @classmethod
+    def lookup_cellname(cls, cellname):
+        if not isinstance(cellname, str):
+            return None
+        return cls._cells.get(cellname)
+
     @classmethod
     def get_cell_color(cls, cellname):
         pos = cls.cellname_to_pos(cellname)
         if not pos:
             return None
         return sum(pos) % 2
+
+
+# Both letter cases of every square name, so lookups skip parsing
+Validator._cells = {
+    name: Validator.cellname_to_pos(name.upper())
+    for column in Validator._letters[1:]
+    for row in '12345678'
+    for name in (f'{column}{row}', f'{column.lower()}{row}')
+}